@@ -0,0 +1,71 @@
+import json
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads in this process are serialized
+    fcntl = None
+
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', 'archive')
+
+# A new segment file is started once the current one reaches this size
+SEGMENT_MAX_BYTES = int(os.environ.get('ARCHIVE_SEGMENT_MAX_BYTES', str(64 * 1024 * 1024)))
+
+# Every record is a 4-byte big-endian length followed by zlib-compressed JSON
+_HEADER = struct.Struct('>I')
+
+_lock = threading.Lock()
+
+@contextmanager
+def _append_lock():
+    """Serialize appenders across threads and, where supported, across processes."""
+    with _lock:
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(ARCHIVE_DIR, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _current_segment() -> str:
+    segments = sorted(name for name in os.listdir(ARCHIVE_DIR) if name.startswith('segment-'))
+    if segments and os.path.getsize(os.path.join(ARCHIVE_DIR, segments[-1])) < SEGMENT_MAX_BYTES:
+        return segments[-1]
+    number = int(segments[-1][len('segment-'):-len('.zlog')]) + 1 if segments else 1
+    return f'segment-{number:06d}.zlog'
+
+def append_records(records: list) -> list:
+    """
+    Append records to the current segment and return where each one landed.
+
+    Segments are append-only, so bytes already written never change and
+    readers need no locking. The data is fsynced before this returns, so
+    callers can safely delete the originals afterwards.
+    """
+    locations = []
+    with _append_lock():
+        segment = _current_segment()
+        with open(os.path.join(ARCHIVE_DIR, segment), 'ab') as f:
+            offset = f.tell()
+            for record in records:
+                data = zlib.compress(json.dumps(record).encode('utf-8'), 6)
+                f.write(_HEADER.pack(len(data)) + data)
+                locations.append((segment, offset + _HEADER.size, len(data)))
+                offset += _HEADER.size + len(data)
+            f.flush()
+            os.fsync(f.fileno())
+    return locations
+
+def read_record(segment: str, offset: int, length: int) -> dict:
+    """Read one record back from its location."""
+    with open(os.path.join(ARCHIVE_DIR, segment), 'rb') as f:
+        f.seek(offset)
+        return json.loads(zlib.decompress(f.read(length)))
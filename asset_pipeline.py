@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+
+import streamlit as st
+from PIL import Image
+
+ASSET_DIR = 'assets'
+VARIANT_DIR = os.path.join(ASSET_DIR, 'variants')
+MANIFEST_PATH = os.path.join(VARIANT_DIR, 'manifest.json')
+
+# Widths variants are produced at; a page asks for the smallest that fits
+WIDTH_BUCKETS = (480, 960, 1440, 1920)
+
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+JPEG_QUALITY = 82
+
+# st.image passes JPEG bytes through untouched when told their format; any
+# other format, WebP included, is re-encoded to JPEG on every rerun
+IMAGE_FORMAT = 'JPEG'
+
+def _content_hash(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+def _build_source(name: str, source_hash: str) -> dict:
+    """Decode one source image once and write every variant of it."""
+    stem = os.path.splitext(name)[0]
+    variants = []
+    with Image.open(os.path.join(ASSET_DIR, name)) as image:
+        image = image.convert('RGB')
+        width, height = image.size
+        # Never upscale: the original width is the largest bucket
+        widths = sorted({w for w in WIDTH_BUCKETS if w < width} | {min(width, WIDTH_BUCKETS[-1])})
+        for target in widths:
+            resized = image if target == width else image.resize(
+                (target, round(height * target / width)), Image.LANCZOS
+            )
+            path = os.path.join(VARIANT_DIR, f"{stem}-{target}-{source_hash}.jpg")
+            resized.save(path, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+            variants.append({'width': target, 'format': 'jpeg', 'path': path, 'bytes': os.path.getsize(path)})
+    return {'hash': source_hash, 'width': width, 'height': height, 'variants': variants}
+
+def build_variants() -> dict:
+    """
+    Produce resized variants of every image in the assets directory.
+
+    Variant file names carry the content hash of their source, and sources
+    whose hash matches the existing manifest are skipped, so running this on
+    every start only does work when an image actually changed.
+    """
+    os.makedirs(VARIANT_DIR, exist_ok=True)
+    try:
+        with open(MANIFEST_PATH, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        manifest = {}
+
+    changed = False
+    for name in sorted(os.listdir(ASSET_DIR)):
+        if not name.lower().endswith(SOURCE_EXTENSIONS):
+            continue
+        source_hash = _content_hash(os.path.join(ASSET_DIR, name))
+        entry = manifest.get(name)
+        if (entry and entry['hash'] == source_hash and all(os.path.exists(v['path']) for v in entry['variants'])
+                and all(v['format'] == 'jpeg' for v in entry['variants'])):
+            continue
+        manifest[name] = _build_source(name, source_hash)
+        changed = True
+        # Drop the variants of the previous version of this image
+        current = {v['path'] for v in manifest[name]['variants']}
+        for variant in (entry or {}).get('variants', []):
+            if variant['path'] not in current and os.path.exists(variant['path']):
+                os.remove(variant['path'])
+
+    if changed:
+        tmp_path = MANIFEST_PATH + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, MANIFEST_PATH)
+    return manifest
+
+@st.cache_resource
+def get_manifest() -> dict:
+    """Build variants once per process and return the manifest."""
+    return build_variants()
+
+@st.cache_resource
+def get_image(name: str, width: int) -> bytes:
+    """
+    Return the JPEG bytes of the smallest variant of an asset at least width wide.
+
+    Pass output_format=IMAGE_FORMAT to st.image along with them, so Streamlit
+    serves the bytes as they are. They are cached for the life of the
+    process, so reruns neither decode nor re-read the image.
+    """
+    candidates = sorted(get_manifest()[name]['variants'], key=lambda v: v['width'])
+    fitting = [v for v in candidates if v['width'] >= width]
+    # Nothing wide enough: fall back to the largest variant
+    choice = fitting[0] if fitting else candidates[-1]
+    with open(choice['path'], 'rb') as f:
+        return f.read()
+
+if __name__ == "__main__":
+    for name, entry in build_variants().items():
+        sizes = ', '.join(f"{v['width']}px {v['format']} {v['bytes'] // 1024}KB" for v in entry['variants'])
+        print(f"{name}: {sizes}")
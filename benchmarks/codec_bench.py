@@ -0,0 +1,138 @@
+"""
+Disk footprint and read cost of each message codec.
+
+Stores the same synthetic conversations once per codec, each in a fresh
+database, then reports the stored content size, the database file size
+and the time get_messages() takes per conversation, as JSON. The former
+one-JSON-blob-per-conversation layout is included as a baseline:
+
+    python benchmarks/codec_bench.py --conversations 200 --messages 30 --output codecs.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = ("silicon valley visit museum campus startup founder investor tour stanford palo alto "
+         "mountain view cupertino san jose computer history innovation network meetup accelerator "
+         "engineering product demo coffee caltrain itinerary hotel week morning afternoon evening "
+         "recommend schedule booking ticket garage hackathon university research lab").split()
+
+def make_text(rng: random.Random, words: int) -> str:
+    sentences = []
+    while words > 0:
+        length = min(words, rng.randint(6, 18))
+        sentences.append(' '.join(rng.choice(WORDS) for _ in range(length)).capitalize() + '.')
+        words -= length
+    return ' '.join(sentences)
+
+def make_conversation(rng: random.Random, messages: int) -> list:
+    # Short user prompts, longer assistant answers, as in the chat
+    return [{
+        'role': 'user' if i % 2 == 0 else 'assistant',
+        'content': make_text(rng, rng.randint(5, 40) if i % 2 == 0 else rng.randint(60, 400)),
+        'timestamp': '2025-01-01 12:00:00',
+        'user': 'bench' if i % 2 == 0 else None,
+    } for i in range(messages)]
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))] if ordered else 0.0
+
+def run_codec(codec: str, conversations: list, workdir: str, repeats: int) -> dict:
+    import database
+    import db_connection
+    from db_connection import close_all, connection
+
+    path = os.path.join(workdir, f'{codec}.db')
+    db_connection.DB_PATH = path
+    database.MESSAGE_CODEC = codec
+    database.init_db(path)
+
+    started = time.perf_counter()
+    for i, history in enumerate(conversations):
+        database.save_conversation(f'user{i}', f'session{i}', history)
+    write_seconds = time.perf_counter() - started
+
+    with connection() as conn:
+        conv_ids = [row[0] for row in conn.execute('SELECT id FROM conversations')]
+        content_bytes, compressed = conn.execute(
+            'SELECT SUM(LENGTH(CAST(content AS BLOB))), SUM(content_format != 0) FROM messages'
+        ).fetchone()
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    timings = []
+    for _ in range(repeats):
+        for conv_id in conv_ids:
+            started = time.perf_counter()
+            database.get_messages(conv_id)
+            timings.append(time.perf_counter() - started)
+
+    close_all()
+    return {
+        'codec': codec,
+        'content_bytes': content_bytes,
+        'compressed_messages': compressed,
+        'db_file_bytes': os.path.getsize(path),
+        'write_seconds': write_seconds,
+        'read_ms_mean': sum(timings) / len(timings) * 1000,
+        'read_ms_p50': percentile(timings, 50) * 1000,
+        'read_ms_p95': percentile(timings, 95) * 1000,
+    }
+
+def run_legacy_blob(conversations: list, repeats: int) -> dict:
+    """The former storage: one JSON document per conversation, parsed whole on every read."""
+    blobs = [json.dumps(history, indent=2) for history in conversations]
+    timings = []
+    for _ in range(repeats):
+        for blob in blobs:
+            started = time.perf_counter()
+            json.loads(blob)
+            timings.append(time.perf_counter() - started)
+    return {
+        'codec': 'legacy_json_blob',
+        'content_bytes': sum(len(blob.encode('utf-8')) for blob in blobs),
+        # Parse time only; the database read of the blob comes on top
+        'read_ms_mean': sum(timings) / len(timings) * 1000,
+        'read_ms_p50': percentile(timings, 50) * 1000,
+        'read_ms_p95': percentile(timings, 95) * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Message codec benchmark")
+    parser.add_argument('--conversations', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=30, help="messages per conversation")
+    parser.add_argument('--repeats', type=int, default=3, help="times every conversation is read")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='visit_sv_codec_')
+    os.environ['CONVERSATIONS_DB_PATH'] = os.path.join(workdir, 'unused.db')
+    sys.path.insert(0, ROOT)
+    import database
+
+    rng = random.Random(args.seed)
+    conversations = [make_conversation(rng, args.messages) for _ in range(args.conversations)]
+    codecs = ['plain', 'zlib'] + (['zstd'] if database.zstandard is not None else [])
+    results = {
+        'config': vars(args),
+        'compress_min_bytes': database.MESSAGE_COMPRESS_MIN_BYTES,
+        'codecs': [run_legacy_blob(conversations, args.repeats)]
+                  + [run_codec(codec, conversations, workdir, args.repeats) for codec in codecs],
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
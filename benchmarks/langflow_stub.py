@@ -0,0 +1,109 @@
+"""
+Local stand-in for the LangFlow run API, for load testing.
+
+Answers POST /api/v1/run/<endpoint> after a sampled latency, fails a
+configurable fraction of requests with a 500, and supports ?stream=true
+with one token event per word followed by an end event.
+
+    python benchmarks/langflow_stub.py --port 7861 --latency-ms 800 --error-rate 0.02
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ANSWER = ("Silicon Valley is worth a visit for its museums, campuses and startup "
+          "culture. Start with the Computer History Museum, then walk University "
+          "Avenue in Palo Alto and book a Stanford campus tour.")
+
+class StubConfig:
+    def __init__(self, latency_ms: float = 500.0, jitter: float = 0.5, error_rate: float = 0.0,
+                 token_delay_ms: float = 10.0):
+        # Latency is lognormal around latency_ms; jitter is its sigma
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.token_delay_ms = token_delay_ms
+
+    def sample_latency(self) -> float:
+        if self.latency_ms <= 0:
+            return 0.0
+        return random.lognormvariate(0, self.jitter) * self.latency_ms / 1000 if self.jitter else self.latency_ms / 1000
+
+def _result(text: str) -> dict:
+    return {"outputs": [{"outputs": [{"results": {"message": {"text": text}}}]}]}
+
+def make_handler(config: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+
+            if not url.path.startswith("/api/v1/run/"):
+                self._send_json(404, {"detail": "Not Found"})
+                return
+
+            time.sleep(config.sample_latency())
+            if random.random() < config.error_rate:
+                self._send_json(500, {"detail": "stub failure"})
+                return
+
+            text = f"{ANSWER} (You said: {payload.get('input_value', '')[:40]})"
+            if parse_qs(url.query).get("stream") == ["true"]:
+                self._stream(text)
+            else:
+                self._send_json(200, _result(text))
+
+        def _send_json(self, status: int, body: dict):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _stream(self, text: str):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            events = [{"event": "token", "data": {"chunk": word + " "}} for word in text.split()]
+            events.append({"event": "end", "data": {"result": _result(text)}})
+            for event in events:
+                line = (json.dumps(event) + "\n\n").encode()
+                self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                self.wfile.flush()
+                time.sleep(config.token_delay_ms / 1000)
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+def start_stub(config: StubConfig, port: int = 0) -> ThreadingHTTPServer:
+    """Start the stub on a background thread; port 0 picks a free port."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local LangFlow stub")
+    parser.add_argument("--port", type=int, default=7861)
+    parser.add_argument("--latency-ms", type=float, default=500.0)
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = start_stub(StubConfig(args.latency_ms, args.jitter, args.error_rate), args.port)
+    print(f"LangFlow stub listening on http://127.0.0.1:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,245 @@
+"""
+Concurrent-session load test for the chat, admin and community code paths.
+
+Each simulated session submits its turns to the app's job queue, as the
+chat page does, and waits for the answer, so at most
+LANGFLOW_MAX_IN_FLIGHT turns call LangFlow at once and the rest queue.
+The time a turn waited for a worker is reported separately from the time
+spent in LangFlow. Every few turns a session also saves the full
+conversation, lists conversations as the admin dashboard does, and posts
+to and reads the community feed. LangFlow is a local stub with
+configurable latency and error rate, and the databases live in a fresh
+temporary directory.
+
+Results are printed (or written with --output) as JSON, so runs can be
+compared across commits:
+
+    python benchmarks/load_test.py --sessions 20 --turns 10 --latency-ms 300 --output before.json
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Concurrent-session load test")
+    parser.add_argument('--sessions', type=int, default=10, help="concurrent simulated sessions")
+    parser.add_argument('--turns', type=int, default=10, help="chat turns per session")
+    parser.add_argument('--latency-ms', type=float, default=200.0, help="median stub LangFlow latency")
+    parser.add_argument('--jitter', type=float, default=0.5, help="lognormal sigma of the stub latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of stub requests that fail")
+    parser.add_argument('--stream', action='store_true', help="use the streaming LangFlow path")
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                        help="job queue workers (default: LANGFLOW_MAX_IN_FLIGHT or the app default)")
+    parser.add_argument('--max-queued', type=int, default=None,
+                        help="turns allowed to wait (default: LANGFLOW_MAX_QUEUED or the app default)")
+    parser.add_argument('--poll-ms', type=float, default=10.0, help="how often a session checks its turn")
+    parser.add_argument('--every', type=int, default=5, help="turns between save/list/community operations")
+    parser.add_argument('--seed', type=int, default=None, help="random seed for reproducible runs")
+    parser.add_argument('--output', help="write the JSON results to this file instead of stdout")
+    return parser.parse_args()
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+class Recorder:
+    """Collect latencies and errors per operation from many threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def time(self, operation: str, func, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.error(operation, type(e).__name__)
+            return None
+        self.record(operation, time.perf_counter() - started)
+        return result
+
+    def record(self, operation: str, elapsed: float):
+        with self.lock:
+            self.latencies.setdefault(operation, []).append(elapsed)
+
+    def error(self, operation: str, name: str):
+        with self.lock:
+            self.errors.setdefault(operation, {})
+            self.errors[operation][name] = self.errors[operation].get(name, 0) + 1
+
+    def summary(self, wall_time: float) -> dict:
+        operations = {}
+        for operation in sorted(set(self.latencies) | set(self.errors)):
+            latencies = self.latencies.get(operation, [])
+            errors = sum(self.errors.get(operation, {}).values())
+            operations[operation] = {
+                'count': len(latencies),
+                'errors': errors,
+                'error_types': self.errors.get(operation, {}),
+                'throughput_per_s': len(latencies) / wall_time if wall_time else 0.0,
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p95_ms': percentile(latencies, 95) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+                'max_ms': max(latencies) * 1000 if latencies else 0.0,
+            }
+        return operations
+
+def _message(role: str, content: str, user: str = None) -> dict:
+    return {'role': role, 'content': content,
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 'user': user}
+
+def wait_for_turn(job, args, recorder: Recorder):
+    """Poll a submitted turn as the chat page does; returns the answer, or None if it failed."""
+    while not job.done:
+        time.sleep(args.poll_ms / 1000)
+    if job.status == 'failed':
+        recorder.error('chat_turn', 'JobFailed')
+        return None
+    # From submission to answer, queue wait included
+    recorder.record('chat_turn', time.monotonic() - job.submitted_at)
+    return job.result
+
+def run_session(index: int, args, recorder: Recorder, completed: list):
+    # Imported here so the database paths and queue settings set in main() are picked up
+    from community_store import add_post, get_category_counts, get_posts_page
+    from database import get_conversation, list_conversations, save_conversation
+    from job_queue import QueueFullError, submit_turn
+
+    username = f"loadtest_{index}"
+    session_id = f"session-{index}"
+    for turn in range(args.turns):
+        prompt = f"Turn {turn}: what should I see near Palo Alto? " + "details " * random.randint(0, 40)
+        # The same path as a chat page: the turn is queued, a worker compacts
+        # the history, calls LangFlow and stores the message and answer
+        try:
+            job = submit_turn(username, session_id, _message('user', prompt), stream=args.stream)
+        except QueueFullError:
+            recorder.error('chat_turn', 'QueueFullError')
+            continue
+        answer = wait_for_turn(job, args, recorder)
+        if answer is None:
+            continue
+
+        if (turn + 1) % args.every == 0:
+            # Nothing new to insert, so this measures the save_conversation fast path
+            history = get_conversation(username, session_id)
+            recorder.time('save_conversation', save_conversation, username, session_id, history)
+            # get_all_conversations was replaced by keyset-paginated listing
+            recorder.time('list_conversations', list_conversations, 25)
+            recorder.time('community_add_post', add_post, {
+                'title': f"Dream of {username}", 'content': answer[:500], 'category': 'Dreams',
+                'author': username, 'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            })
+            recorder.time('community_feed_page', get_posts_page)
+            recorder.time('community_category_counts', get_category_counts)
+        with recorder.lock:
+            completed[0] += 1
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def series_ms(row: dict) -> dict:
+    """Count, errors and latencies in milliseconds of one metrics series."""
+    return dict({'count': row['count'], 'errors': row['errors']},
+                **{f"{key}_ms": row[key] * 1000 for key in ('mean', 'p50', 'p95', 'p99')})
+
+def main():
+    args = parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    output_path = os.path.abspath(args.output) if args.output else None
+    workdir = tempfile.mkdtemp(prefix='visit_sv_load_')
+    # Must be set before the database modules are imported, which read them once
+    os.environ['CONVERSATIONS_DB_PATH'] = os.path.join(workdir, 'conversations.db')
+    os.environ['COMMUNITY_DB_PATH'] = os.path.join(workdir, 'community.db')
+    if args.max_in_flight is not None:
+        os.environ['LANGFLOW_MAX_IN_FLIGHT'] = str(args.max_in_flight)
+    if args.max_queued is not None:
+        os.environ['LANGFLOW_MAX_QUEUED'] = str(args.max_queued)
+    # Every turn should reach LangFlow, as it did before caching
+    os.environ['LANGFLOW_RESPONSE_CACHE'] = 'false'
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    # The community store imports community_posts.json relative to the working directory
+    os.chdir(workdir)
+
+    from community_store import init_community_store
+    from database import init_db
+    from db_connection import close_all, lock_stats
+    from metrics import snapshot
+    from job_queue import get_job_queue
+    from langflow_client import get_langflow_client
+    from langflow_stub import StubConfig, start_stub
+
+    stub = start_stub(StubConfig(args.latency_ms, args.jitter, args.error_rate))
+    # The workers use the app's shared client, which is configured from these
+    os.environ['BASE_API_URL'] = f"http://127.0.0.1:{stub.server_address[1]}"
+    os.environ['ENDPOINT'] = "bench"
+    init_db()
+    init_community_store()
+
+    recorder = Recorder()
+    completed = [0]
+    threads = [threading.Thread(target=run_session, args=(i, args, recorder, completed))
+               for i in range(args.sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - started
+
+    stats = lock_stats()
+    metrics = snapshot()
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': vars(args),
+        'wall_time_s': wall_time,
+        'turns_completed': completed[0],
+        'turns_per_s': completed[0] / wall_time if wall_time else 0.0,
+        'operations': recorder.summary(wall_time),
+        # chat_turn above is the whole turn; this splits it into waiting for a
+        # worker and the LangFlow call itself, from the app's own instrumentation
+        'chat_turn_breakdown': {
+            'queue_wait': next((series_ms(row) for row in metrics if row['metric'] == 'job_queue_wait_seconds'), None),
+            'langflow': next((series_ms(row) for row in metrics if row['metric'] == 'langflow_seconds'), None),
+        },
+        'job_queue': get_job_queue().stats(),
+        'sqlite_lock': dict(stats, wait_avg_ms=stats['wait_seconds'] / stats['waits'] * 1000 if stats['waits'] else 0.0),
+        'langflow_client': get_langflow_client().stats(),
+        # Per-function database latencies from the app's own instrumentation
+        'db': {row['labels']['op']: series_ms(row) for row in metrics if row['metric'] == 'db_seconds'},
+    }
+
+    stub.shutdown()
+    close_all()
+    output = json.dumps(results, indent=2)
+    if output_path:
+        with open(output_path, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import json
+import os
+
+from db_connection import connection, transaction, retry_on_locked
+from metrics import timed
+
+COMMUNITY_DB_PATH = os.environ.get('COMMUNITY_DB_PATH', 'community.db')
+
+# Posts used to live in this file; it is imported once into the store
+LEGACY_POSTS_PATH = 'community_posts.json'
+
+# Checkpoint and truncate the WAL after this many new posts
+COMPACT_EVERY = 200
+
+# Posts shown per page of the community feed
+FEED_PAGE_SIZE = 10
+
+_initialized = False
+
+@retry_on_locked
+def init_community_store():
+    """Create the community tables and import legacy posts on first use."""
+    global _initialized
+    if _initialized:
+        return
+
+    with transaction(COMMUNITY_DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS posts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                content TEXT NOT NULL,
+                category TEXT NOT NULL,
+                author TEXT,
+                date TEXT NOT NULL
+            )
+        ''')
+        # version is bumped in the same transaction as every insert and
+        # paces the WAL compaction
+        c.execute('CREATE TABLE IF NOT EXISTS community_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        c.execute("INSERT OR IGNORE INTO community_meta (key, value) VALUES ('version', 0)")
+        # Kept up to date by every insert, so the category filter and the
+        # statistics never have to scan the posts
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS post_categories (
+                category TEXT PRIMARY KEY,
+                post_count INTEGER NOT NULL
+            )
+        ''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_posts_category ON posts(category, id)')
+        if not c.execute('SELECT 1 FROM post_categories LIMIT 1').fetchone():
+            c.execute('''
+                INSERT INTO post_categories (category, post_count)
+                SELECT category, COUNT(*) FROM posts GROUP BY category
+            ''')
+
+        imported = c.execute("SELECT value FROM community_meta WHERE key = 'legacy_imported'").fetchone()
+        if not imported:
+            for post in _load_legacy_posts():
+                _insert_post(c, post)
+            c.execute("INSERT INTO community_meta (key, value) VALUES ('legacy_imported', 1)")
+
+    _initialized = True
+
+def _load_legacy_posts() -> list:
+    try:
+        with open(LEGACY_POSTS_PATH, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return []
+
+def _insert_post(c, post: dict):
+    c.execute('''
+        INSERT INTO posts (title, content, category, author, date)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (post['title'], post['content'], post['category'], post.get('author'), post['date']))
+    c.execute('''
+        INSERT INTO post_categories (category, post_count) VALUES (?, 1)
+        ON CONFLICT(category) DO UPDATE SET post_count = post_count + 1
+    ''', (post['category'],))
+    c.execute("UPDATE community_meta SET value = value + 1 WHERE key = 'version'")
+
+@timed('db_seconds')
+@retry_on_locked
+def add_post(post: dict):
+    """Append a post; concurrent posters are serialized by the write transaction."""
+    init_community_store()
+    with transaction(COMMUNITY_DB_PATH) as conn:
+        c = conn.cursor()
+        _insert_post(c, post)
+        version = c.execute("SELECT value FROM community_meta WHERE key = 'version'").fetchone()[0]
+
+    if version % COMPACT_EVERY == 0:
+        compact()
+
+@timed('db_seconds')
+@retry_on_locked
+def get_posts_page(page_size: int = FEED_PAGE_SIZE, before_id: int = None, category: str = None) -> tuple:
+    """
+    Return a page of posts, newest first, and the cursor of the next page.
+
+    Pages are keyset-paginated on the post id, so any page costs the same
+    however many posts there are. The cursor is None on the last page.
+    """
+    init_community_store()
+    conditions, params = [], []
+    if before_id is not None:
+        conditions.append('id < ?')
+        params.append(before_id)
+    if category:
+        conditions.append('category = ?')
+        params.append(category)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    with connection(COMMUNITY_DB_PATH) as conn:
+        # One extra row tells whether there is a next page
+        rows = conn.execute(f'''
+            SELECT id, title, content, category, author, date FROM posts
+            {where}
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (*params, page_size + 1)).fetchall()
+
+    posts = [dict(zip(('id', 'title', 'content', 'category', 'author', 'date'), row)) for row in rows[:page_size]]
+    next_cursor = posts[-1]['id'] if len(rows) > page_size else None
+    return posts, next_cursor
+
+@timed('db_seconds')
+@retry_on_locked
+def get_category_counts() -> dict:
+    """Return the number of posts in each category, by category name."""
+    init_community_store()
+    with connection(COMMUNITY_DB_PATH) as conn:
+        return dict(conn.execute('SELECT category, post_count FROM post_categories ORDER BY category').fetchall())
+
+@timed('db_seconds')
+@retry_on_locked
+def compact():
+    """Fold the write-ahead log back into the database file and truncate it."""
+    with connection(COMMUNITY_DB_PATH) as conn:
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
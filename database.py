@@ -1,78 +1,850 @@
-import sqlite3
-from datetime import datetime
+from collections import Counter
+from datetime import datetime, timedelta
+import html
 import json
+import os
+import zlib
+from archive_segments import read_record
+from db_connection import DB_PATH, connection, transaction, retry_on_locked
+from metrics import timed
 
-def init_db():
+try:
+    import zstandard
+except ImportError:  # zstd is optional; zlib is always available
+    zstandard = None
+
+_initialized = set()
+
+# Format tags stored per message in messages.content_format
+CONTENT_PLAIN = 0
+CONTENT_ZLIB = 1
+CONTENT_ZSTD = 2
+
+# Codec used for new messages: plain, zlib or zstd. Compression trades read
+# time for disk (benchmarks/codec_bench.py), so it is opt-in
+MESSAGE_CODEC = os.environ.get('MESSAGE_CODEC', 'plain')
+
+# Shorter messages are stored as plain text; compressing them saves too little
+MESSAGE_COMPRESS_MIN_BYTES = int(os.environ.get('MESSAGE_COMPRESS_MIN_BYTES', '512'))
+
+_CODEC_TAGS = {'plain': CONTENT_PLAIN, 'zlib': CONTENT_ZLIB, 'zstd': CONTENT_ZSTD}
+
+def _zstd_compress(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+def _zstd_decompress(data: bytes) -> bytes:
+    if zstandard is None:
+        raise RuntimeError("This database holds zstd-compressed messages; install the zstandard package")
+    return zstandard.ZstdDecompressor().decompress(data)
+
+_COMPRESSORS = {
+    CONTENT_ZLIB: (lambda data: zlib.compress(data, 6), zlib.decompress),
+    CONTENT_ZSTD: (_zstd_compress, _zstd_decompress),
+}
+
+def codec_tag(codec: str = None) -> int:
+    """Return the format tag new messages are written with for a codec name."""
+    tag = _CODEC_TAGS[codec or MESSAGE_CODEC]
+    if tag == CONTENT_ZSTD and zstandard is None:
+        return CONTENT_ZLIB
+    return tag
+
+def encode_content(content: str, codec: str = None) -> tuple:
+    """
+    Encode message text for storage, returning the stored value and its format tag.
+
+    Text above MESSAGE_COMPRESS_MIN_BYTES is compressed into a BLOB unless
+    that would not make it smaller; everything else is stored as is.
+    """
+    tag = codec_tag(codec)
+    data = content.encode('utf-8')
+    if tag == CONTENT_PLAIN or len(data) < MESSAGE_COMPRESS_MIN_BYTES:
+        return content, CONTENT_PLAIN
+    compressed = _COMPRESSORS[tag][0](data)
+    if len(compressed) >= len(data):
+        return content, CONTENT_PLAIN
+    return compressed, tag
+
+def decode_content(value, tag: int) -> str:
+    """Turn a stored message value back into its text."""
+    if not tag:
+        return value
+    return _COMPRESSORS[tag][1](value).decode('utf-8')
+
+@retry_on_locked
+def init_db(db_path: str = None):
     """Initialize the SQLite database and create necessary tables."""
-    conn = sqlite3.connect('conversations.db')
+    db_path = db_path or DB_PATH
+    # Pages call this on every rerun; the schema only needs checking once per process
+    if db_path in _initialized:
+        return
+
+    with transaction(db_path) as conn:
+        c = conn.cursor()
+
+        # Create conversations table with session_id
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS conversations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                conversation_data TEXT NOT NULL,
+                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(user_id, session_id)
+            )
+        ''')
+
+        # One row per message, so a new turn is a single INSERT instead of
+        # rewriting the whole conversation
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                conversation_id INTEGER NOT NULL REFERENCES conversations(id),
+                seq INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                timestamp TEXT,
+                user TEXT,
+                PRIMARY KEY (conversation_id, seq)
+            )
+        ''')
+
+        # How each message's content is stored; see encode_content()
+        _add_column(c, 'messages', 'content_format', 'INTEGER NOT NULL DEFAULT 0')
+
+        # Running summary of the turns that no longer go to LangFlow verbatim
+        _add_column(c, 'conversations', 'summary', 'TEXT')
+        _add_column(c, 'conversations', 'summary_upto', 'INTEGER NOT NULL DEFAULT 0')
+
+        # Summary columns kept current on every write, so list views never
+        # have to read message bodies
+        _add_column(c, 'conversations', 'message_count', 'INTEGER NOT NULL DEFAULT 0')
+        _add_column(c, 'conversations', 'last_message_preview', 'TEXT')
+        _add_column(c, 'conversations', 'first_message_at', 'TEXT')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_conversations_updated ON conversations(last_updated, id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_conversations_user_updated ON conversations(user_id, last_updated, id)')
+
+        # Full-text index over message content. It keeps its own copy of the
+        # text, so snippets never depend on how messages store it
+        c.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                content,
+                conversation_id UNINDEXED,
+                seq UNINDEXED,
+                role UNINDEXED,
+                timestamp UNINDEXED,
+                tokenize = 'porter unicode61'
+            )
+        ''')
+
+        # Where conversations moved out by retention.py can be found
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS archived_conversations (
+                id INTEGER PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                last_updated TIMESTAMP,
+                message_count INTEGER NOT NULL,
+                segment TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL
+            )
+        ''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_archived_user ON archived_conversations(user_id, id)')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS maintenance_log (
+                ran_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                archived INTEGER NOT NULL,
+                pages_freed INTEGER NOT NULL
+            )
+        ''')
+
+        # Activity rollups, kept up to date by every save so the analytics
+        # page never has to read the messages themselves
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS daily_activity (
+                day TEXT PRIMARY KEY,
+                messages INTEGER NOT NULL DEFAULT 0,
+                user_messages INTEGER NOT NULL DEFAULT 0,
+                conversations_started INTEGER NOT NULL DEFAULT 0,
+                active_users INTEGER NOT NULL DEFAULT 0,
+                langflow_calls INTEGER NOT NULL DEFAULT 0,
+                langflow_errors INTEGER NOT NULL DEFAULT 0,
+                langflow_seconds REAL NOT NULL DEFAULT 0,
+                langflow_max_seconds REAL NOT NULL DEFAULT 0
+            )
+        ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS daily_active_users (
+                day TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                PRIMARY KEY (day, user_id)
+            ) WITHOUT ROWID
+        ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS user_activity (
+                user_id TEXT PRIMARY KEY,
+                messages INTEGER NOT NULL DEFAULT 0,
+                user_messages INTEGER NOT NULL DEFAULT 0,
+                conversations INTEGER NOT NULL DEFAULT 0,
+                first_active TEXT,
+                last_active TEXT
+            )
+        ''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_user_activity_last_active ON user_activity(last_active)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_user_activity_messages ON user_activity(messages)')
+
+        backfill_search_index(conn)
+        migrate_conversation_blobs(conn)
+        backfill_summary_columns(conn)
+        backfill_activity_rollups(conn)
+
+    _initialized.add(db_path)
+
+def _add_column(c, table: str, column: str, definition: str):
+    """Add a column to an existing table unless it is already there."""
+    columns = [row[1] for row in c.execute(f'PRAGMA table_info({table})')]
+    if column not in columns:
+        c.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+def migrate_conversation_blobs(conn):
+    """Explode legacy conversation_data blobs into the messages table."""
     c = conn.cursor()
-    
-    # Create conversations table with session_id
     c.execute('''
-        CREATE TABLE IF NOT EXISTS conversations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            session_id TEXT NOT NULL,
-            conversation_data TEXT NOT NULL,
-            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(user_id, session_id)
-        )
+        SELECT id, conversation_data FROM conversations
+        WHERE conversation_data != '[]'
+        AND NOT EXISTS (SELECT 1 FROM messages WHERE conversation_id = conversations.id)
     ''')
-    
-    conn.commit()
-    conn.close()
 
-def save_conversation(user_id: str, session_id: str, conversation_history: list):
-    """Save or update the conversation history for a user session."""
-    conn = sqlite3.connect('conversations.db')
+    for conv_id, conversation_data in c.fetchall():
+        try:
+            history = json.loads(conversation_data)
+        except json.JSONDecodeError:
+            continue
+        # Older messages named their sender in a 'username' key, which
+        # update_conversations.py still needs once the blob is gone
+        c.executemany('''
+            INSERT INTO messages (conversation_id, seq, role, content, timestamp, user)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(conv_id, seq, msg['role'], msg['content'], msg.get('timestamp'),
+               msg.get('user') or msg.get('username'))
+              for seq, msg in enumerate(history)])
+        c.execute('''
+            INSERT INTO messages_fts (content, conversation_id, seq, role, timestamp)
+            SELECT content, conversation_id, seq, role, timestamp FROM messages WHERE conversation_id = ?
+        ''', (conv_id,))
+        # The messages table is now the source of truth for this conversation
+        c.execute("UPDATE conversations SET conversation_data = '[]' WHERE id = ?", (conv_id,))
+
+def backfill_search_index(conn):
+    """Index messages stored before the full-text index existed."""
     c = conn.cursor()
-    
-    # Convert conversation history to JSON string
-    conversation_json = json.dumps(conversation_history)
-    
-    # Check if user session already exists
-    c.execute('SELECT id FROM conversations WHERE user_id = ? AND session_id = ?', (user_id, session_id))
-    existing = c.fetchone()
-    
-    if existing:
-        # Update existing conversation
+    if c.execute('SELECT 1 FROM messages_fts LIMIT 1').fetchone():
+        return
+    rows = conn.execute('SELECT content, content_format, conversation_id, seq, role, timestamp FROM messages')
+    c.executemany('''
+        INSERT INTO messages_fts (content, conversation_id, seq, role, timestamp)
+        VALUES (?, ?, ?, ?, ?)
+    ''', ((decode_content(content, fmt), *rest) for content, fmt, *rest in rows))
+
+def backfill_summary_columns(conn):
+    """Compute the summary columns of conversations written before they existed."""
+    c = conn.cursor()
+    c.execute('''
+        SELECT id FROM conversations
+        WHERE message_count = 0
+        AND EXISTS (SELECT 1 FROM messages WHERE conversation_id = conversations.id)
+    ''')
+
+    for (conv_id,) in c.fetchall():
+        count, first_message_at = c.execute(
+            'SELECT COUNT(*), MIN(timestamp) FROM messages WHERE conversation_id = ?', (conv_id,)
+        ).fetchone()
+        last_content = decode_content(*c.execute(
+            'SELECT content, content_format FROM messages WHERE conversation_id = ? ORDER BY seq DESC LIMIT 1',
+            (conv_id,)
+        ).fetchone())
         c.execute('''
-            UPDATE conversations 
-            SET conversation_data = ?, last_updated = CURRENT_TIMESTAMP
-            WHERE user_id = ? AND session_id = ?
-        ''', (conversation_json, user_id, session_id))
-    else:
-        # Insert new conversation
+            UPDATE conversations SET message_count = ?, last_message_preview = ?, first_message_at = ?
+            WHERE id = ?
+        ''', (count, _preview(last_content), first_message_at, conv_id))
+
+def backfill_activity_rollups(conn):
+    """Build the activity rollups from the messages stored before they existed."""
+    c = conn.cursor()
+    if c.execute('SELECT 1 FROM daily_activity LIMIT 1').fetchone():
+        return
+    if not c.execute('SELECT 1 FROM messages LIMIT 1').fetchone():
+        return
+
+    # Messages without a timestamp count on the day their conversation was last updated
+    c.execute('''
+        CREATE TEMP TABLE message_days AS
+        SELECT c.user_id, m.conversation_id, m.seq, m.role,
+               COALESCE(substr(m.timestamp, 1, 10), date(c.last_updated)) AS day
+        FROM messages m JOIN conversations c ON c.id = m.conversation_id
+    ''')
+    c.execute('''
+        INSERT INTO daily_activity (day, messages, user_messages, conversations_started)
+        SELECT day, COUNT(*), SUM(role = 'user'), SUM(seq = 0) FROM message_days GROUP BY day
+    ''')
+    c.execute('INSERT INTO daily_active_users (day, user_id) SELECT DISTINCT day, user_id FROM message_days')
+    c.execute('''
+        UPDATE daily_activity
+        SET active_users = (SELECT COUNT(*) FROM daily_active_users WHERE day = daily_activity.day)
+    ''')
+    c.execute('''
+        INSERT INTO user_activity (user_id, messages, user_messages, conversations, first_active, last_active)
+        SELECT user_id, COUNT(*), SUM(role = 'user'), COUNT(DISTINCT conversation_id), MIN(day), MAX(day)
+        FROM message_days GROUP BY user_id
+    ''')
+    c.execute('DROP TABLE message_days')
+
+def _today() -> str:
+    return datetime.now().strftime('%Y-%m-%d')
+
+def activity_days(messages: list, default_day: str = None) -> tuple:
+    """Count messages, and user messages, per day of their timestamp, or default_day without one."""
+    default_day = default_day or _today()
+    days = Counter((message.get('timestamp') or default_day)[:10] for message in messages)
+    user_days = Counter((message.get('timestamp') or default_day)[:10] for message in messages
+                        if message['role'] == 'user')
+    return days, user_days
+
+def _record_activity(c, user_id: str, messages: list, new_conversation: bool):
+    """Add newly stored messages to the daily and per-user rollups."""
+    # Messages are counted on the day of their own timestamp, as in the backfill
+    days, user_days = activity_days(messages)
+    first_day = min(days)
+    for day, count in days.items():
+        new_user = c.execute('INSERT OR IGNORE INTO daily_active_users (day, user_id) VALUES (?, ?)',
+                             (day, user_id)).rowcount
         c.execute('''
-            INSERT INTO conversations (user_id, session_id, conversation_data)
-            VALUES (?, ?, ?)
-        ''', (user_id, session_id, conversation_json))
-    
-    conn.commit()
-    conn.close()
+            INSERT INTO daily_activity (day, messages, user_messages, conversations_started, active_users)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(day) DO UPDATE SET
+                messages = messages + excluded.messages,
+                user_messages = user_messages + excluded.user_messages,
+                conversations_started = conversations_started + excluded.conversations_started,
+                active_users = active_users + excluded.active_users
+        ''', (day, count, user_days[day], int(new_conversation and day == first_day), new_user))
+    c.execute('''
+        INSERT INTO user_activity (user_id, messages, user_messages, conversations, first_active, last_active)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            messages = messages + excluded.messages,
+            user_messages = user_messages + excluded.user_messages,
+            conversations = conversations + excluded.conversations,
+            last_active = MAX(last_active, excluded.last_active)
+    ''', (user_id, len(messages), sum(user_days.values()), int(new_conversation), first_day, max(days)))
+
+def _active_elsewhere(c, user_id: str, day: str) -> bool:
+    """
+    Whether user_id may have other messages on day.
+
+    Live messages are checked exactly. Archived conversations only record
+    when they ended, so one that ended on or after day counts as active.
+    """
+    return c.execute('''
+        SELECT EXISTS (
+            SELECT 1 FROM conversations c JOIN messages m ON m.conversation_id = c.id
+            WHERE c.user_id = ? AND COALESCE(substr(m.timestamp, 1, 10), date(c.last_updated)) = ?
+        ) OR EXISTS (
+            SELECT 1 FROM archived_conversations WHERE user_id = ? AND date(last_updated) >= ?
+        )
+    ''', (user_id, day, user_id, day)).fetchone()[0] == 1
+
+def move_activity(c, old_user_id: str, new_user_id: str, days: Counter, user_days: Counter):
+    """
+    Move one conversation's messages from one user's rollups to another's.
+
+    Call it after the conversation's user_id has been changed, in the same
+    transaction. Totals per day do not change; only who was active does.
+    The old user's first and last active days are left as they were.
+    """
+    messages, user_messages = sum(days.values()), sum(user_days.values())
+    c.execute('''
+        UPDATE user_activity
+        SET messages = messages - ?, user_messages = user_messages - ?, conversations = conversations - 1
+        WHERE user_id = ?
+    ''', (messages, user_messages, old_user_id))
+    c.execute('DELETE FROM user_activity WHERE user_id = ? AND conversations <= 0', (old_user_id,))
+    c.execute('''
+        INSERT INTO user_activity (user_id, messages, user_messages, conversations, first_active, last_active)
+        VALUES (?, ?, ?, 1, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            messages = messages + excluded.messages,
+            user_messages = user_messages + excluded.user_messages,
+            conversations = conversations + 1,
+            first_active = MIN(first_active, excluded.first_active),
+            last_active = MAX(last_active, excluded.last_active)
+    ''', (new_user_id, messages, user_messages, min(days), max(days)))
+
+    for day in days:
+        active_change = c.execute('INSERT OR IGNORE INTO daily_active_users (day, user_id) VALUES (?, ?)',
+                                  (day, new_user_id)).rowcount
+        if not _active_elsewhere(c, old_user_id, day):
+            active_change -= c.execute('DELETE FROM daily_active_users WHERE day = ? AND user_id = ?',
+                                       (day, old_user_id)).rowcount
+        if active_change:
+            c.execute('UPDATE daily_activity SET active_users = active_users + ? WHERE day = ?',
+                      (active_change, day))
+
+def _record_langflow_call(c, seconds: float, failed: bool):
+    """Add one LangFlow call to today's latency rollup."""
+    c.execute('''
+        INSERT INTO daily_activity (day, langflow_calls, langflow_errors, langflow_seconds, langflow_max_seconds)
+        VALUES (?, 1, ?, ?, ?)
+        ON CONFLICT(day) DO UPDATE SET
+            langflow_calls = langflow_calls + 1,
+            langflow_errors = langflow_errors + excluded.langflow_errors,
+            langflow_seconds = langflow_seconds + excluded.langflow_seconds,
+            langflow_max_seconds = MAX(langflow_max_seconds, excluded.langflow_max_seconds)
+    ''', (_today(), int(failed), seconds, seconds))
+
+def _preview(content: str) -> str:
+    return content[:100] + "..." if len(content) > 100 else content
+
+def _get_or_create_conversation(c, user_id: str, session_id: str) -> int:
+    """Return the id of the conversation for a user session, creating it if needed."""
+    c.execute('''
+        INSERT OR IGNORE INTO conversations (user_id, session_id, conversation_data)
+        VALUES (?, ?, '[]')
+    ''', (user_id, session_id))
+    c.execute('SELECT id FROM conversations WHERE user_id = ? AND session_id = ?', (user_id, session_id))
+    return c.fetchone()[0]
+
+def _insert_messages(c, conv_id: int, user_id: str, messages: list):
+    """Append messages at the next sequence numbers of a conversation and count them in the rollups."""
+    if not messages:
+        return
+    start = c.execute('SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE conversation_id = ?', (conv_id,)).fetchone()[0]
+    rows = [(conv_id, start + i, message['role'], *encode_content(message['content']),
+             message.get('timestamp'), message.get('user'))
+            for i, message in enumerate(messages)]
+    c.executemany('''
+        INSERT INTO messages (conversation_id, seq, role, content, content_format, timestamp, user)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    # The search index always gets the plain text
+    c.executemany('''
+        INSERT INTO messages_fts (content, conversation_id, seq, role, timestamp)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(message['content'], conv_id, start + i, message['role'], message.get('timestamp'))
+          for i, message in enumerate(messages)])
+    c.execute('''
+        UPDATE conversations
+        SET message_count = message_count + ?,
+            last_message_preview = ?,
+            first_message_at = COALESCE(first_message_at, ?),
+            last_updated = CURRENT_TIMESTAMP
+        WHERE id = ?
+    ''', (len(messages), _preview(messages[-1]['content']), messages[0].get('timestamp'), conv_id))
+    _record_activity(c, user_id, messages, new_conversation=start == 0)
+
+@timed('db_seconds')
+@retry_on_locked
+def append_message(user_id: str, session_id: str, message: dict):
+    """Append a single message to a user session's conversation."""
+    with transaction() as conn:
+        c = conn.cursor()
+        conv_id = _get_or_create_conversation(c, user_id, session_id)
+        _insert_messages(c, conv_id, user_id, [message])
+
+@timed('db_seconds')
+@retry_on_locked
+def save_turn(user_id: str, session_id: str, messages: list, summary: str = None, summary_upto: int = None,
+              langflow_seconds: float = None, langflow_failed: bool = False):
+    """Store the new messages of a turn, the updated running summary and the LangFlow timing in one transaction."""
+    with transaction() as conn:
+        c = conn.cursor()
+        conv_id = _get_or_create_conversation(c, user_id, session_id)
+        _insert_messages(c, conv_id, user_id, messages)
+        if langflow_seconds is not None:
+            _record_langflow_call(c, langflow_seconds, langflow_failed)
+        if summary_upto is not None:
+            c.execute('UPDATE conversations SET summary = ?, summary_upto = ? WHERE id = ?',
+                      (summary, summary_upto, conv_id))
+
+@timed('db_seconds')
+@retry_on_locked
+def save_conversation(user_id: str, session_id: str, conversation_history: list):
+    """Save or update the conversation history for a user session.
+
+    Only messages beyond those already stored are inserted, so the cost of a
+    save depends on the number of new messages, not the length of the chat.
+    """
+    with transaction() as conn:
+        c = conn.cursor()
+        conv_id = _get_or_create_conversation(c, user_id, session_id)
+        c.execute('SELECT message_count FROM conversations WHERE id = ?', (conv_id,))
+        stored = c.fetchone()[0]
+
+        _insert_messages(c, conv_id, user_id, conversation_history[stored:])
+
+@timed('db_seconds')
+@retry_on_locked
+def get_conversation_summary(user_id: str, session_id: str) -> tuple:
+    """Return the running summary of a user session and how many messages it covers."""
+    with connection() as conn:
+        result = conn.execute(
+            'SELECT summary, summary_upto FROM conversations WHERE user_id = ? AND session_id = ?',
+            (user_id, session_id)
+        ).fetchone()
 
+    if result:
+        return result[0], result[1]
+    return None, 0
+
+@timed('db_seconds')
+@retry_on_locked
+def save_conversation_summary(user_id: str, session_id: str, summary: str, summary_upto: int):
+    """Store the running summary of a user session."""
+    with transaction() as conn:
+        conn.execute(
+            'UPDATE conversations SET summary = ?, summary_upto = ? WHERE user_id = ? AND session_id = ?',
+            (summary, summary_upto, user_id, session_id)
+        )
+
+def _rows_to_messages(rows) -> list:
+    return [{'role': role, 'content': decode_content(content, fmt), 'timestamp': timestamp, 'user': user}
+            for role, content, fmt, timestamp, user in rows]
+
+@timed('db_seconds')
+@retry_on_locked
+def get_messages(conversation_id: int, start_seq: int = 0) -> list:
+    """Retrieve the messages of a conversation by its ID, in order, from a sequence number onwards."""
+    with connection() as conn:
+        rows = conn.execute('''
+            SELECT role, content, content_format, timestamp, user FROM messages
+            WHERE conversation_id = ? AND seq >= ? ORDER BY seq
+        ''', (conversation_id, start_seq)).fetchall()
+
+    return _rows_to_messages(rows)
+
+@timed('db_seconds')
+@retry_on_locked
+def get_conversation_status(conv_id: int) -> tuple:
+    """Return a conversation's message count and last update time, or None if it does not exist.
+
+    This is a single primary-key lookup, cheap enough to poll for new messages.
+    """
+    with connection() as conn:
+        return conn.execute('SELECT message_count, last_updated FROM conversations WHERE id = ?',
+                            (conv_id,)).fetchone()
+
+@timed('db_seconds')
+@retry_on_locked
 def get_conversation(user_id: str, session_id: str) -> list:
     """Retrieve the conversation history for a user session."""
-    conn = sqlite3.connect('conversations.db')
-    c = conn.cursor()
-    
-    c.execute('SELECT conversation_data FROM conversations WHERE user_id = ? AND session_id = ?', (user_id, session_id))
-    result = c.fetchone()
-    
-    conn.close()
-    
-    if result:
-        return json.loads(result[0])
-    return []
+    with connection() as conn:
+        rows = conn.execute('''
+            SELECT m.role, m.content, m.content_format, m.timestamp, m.user
+            FROM messages m JOIN conversations c ON c.id = m.conversation_id
+            WHERE c.user_id = ? AND c.session_id = ?
+            ORDER BY m.seq
+        ''', (user_id, session_id)).fetchall()
+
+    return _rows_to_messages(rows)
+
+@timed('db_seconds')
+@retry_on_locked
+def get_recent_messages(user_id: str, session_id: str, limit: int, before_seq: int = None) -> tuple:
+    """
+    Retrieve the latest messages of a user session, oldest first.
+
+    Only messages with a sequence number below before_seq are considered when
+    it is given. Returns the messages and the sequence number of the first one.
+    """
+    condition, params = '', [user_id, session_id]
+    if before_seq is not None:
+        condition = 'AND m.seq < ?'
+        params.append(before_seq)
+
+    with connection() as conn:
+        rows = conn.execute(f'''
+            SELECT m.seq, m.role, m.content, m.content_format, m.timestamp, m.user
+            FROM messages m JOIN conversations c ON c.id = m.conversation_id
+            WHERE c.user_id = ? AND c.session_id = ? {condition}
+            ORDER BY m.seq DESC
+            LIMIT ?
+        ''', (*params, limit)).fetchall()
+
+    rows.reverse()
+    first_seq = rows[0][0] if rows else (before_seq or 0)
+    return _rows_to_messages(row[1:] for row in rows), first_seq
 
+@timed('db_seconds')
+@retry_on_locked
+def get_messages_since(user_id: str, session_id: str, start_seq: int) -> list:
+    """Retrieve the messages of a user session from a sequence number onwards."""
+    with connection() as conn:
+        rows = conn.execute('''
+            SELECT m.role, m.content, m.content_format, m.timestamp, m.user
+            FROM messages m JOIN conversations c ON c.id = m.conversation_id
+            WHERE c.user_id = ? AND c.session_id = ? AND m.seq >= ?
+            ORDER BY m.seq
+        ''', (user_id, session_id, start_seq)).fetchall()
+
+    return _rows_to_messages(rows)
+
+@timed('db_seconds')
+@retry_on_locked
 def get_user_sessions(user_id: str) -> list:
     """Get all sessions for a user."""
-    conn = sqlite3.connect('conversations.db')
-    c = conn.cursor()
-    
-    c.execute('SELECT session_id, last_updated FROM conversations WHERE user_id = ? ORDER BY last_updated DESC', (user_id,))
-    sessions = c.fetchall()
-    
-    conn.close()
-    
-    return [{'session_id': session[0], 'last_updated': session[1]} for session in sessions] 
\ No newline at end of file
+    with connection() as conn:
+        sessions = conn.execute(
+            'SELECT session_id, last_updated FROM conversations WHERE user_id = ? ORDER BY last_updated DESC',
+            (user_id,)
+        ).fetchall()
+
+    return [{'session_id': session[0], 'last_updated': session[1]} for session in sessions]
+
+def _conversation_summary(row) -> dict:
+    id, user_id, session_id, message_count, last_message_preview, first_message_at, last_updated = row
+    return {
+        'id': id,
+        'user_id': user_id,
+        'session_id': session_id,
+        'message_count': message_count,
+        'last_message_preview': last_message_preview or "No messages",
+        'first_message_at': first_message_at,
+        'last_updated': last_updated
+    }
+
+@timed('db_seconds')
+@retry_on_locked
+def list_conversations(page_size: int = 25, cursor: tuple = None, user_id: str = None,
+                       newest_first: bool = True) -> tuple:
+    """
+    Return one page of conversation summaries and the cursor of the next page.
+
+    Pages are keyed on (last_updated, id) rather than OFFSET, so fetching a
+    page costs the same however deep into the list it is. The returned
+    cursor is None on the last page.
+    """
+    direction, op = ('DESC', '<') if newest_first else ('ASC', '>')
+    conditions, params = [], []
+    if user_id:
+        conditions.append('user_id = ?')
+        params.append(user_id)
+    if cursor:
+        conditions.append(f'(last_updated, id) {op} (?, ?)')
+        params.extend(cursor)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    with connection() as conn:
+        rows = conn.execute(f'''
+            SELECT id, user_id, session_id, message_count, last_message_preview, first_message_at, last_updated
+            FROM conversations {where}
+            ORDER BY last_updated {direction}, id {direction}
+            LIMIT ?
+        ''', (*params, page_size + 1)).fetchall()
+
+    conversations = [_conversation_summary(row) for row in rows[:page_size]]
+    next_cursor = None
+    if len(rows) > page_size:
+        last = conversations[-1]
+        next_cursor = (last['last_updated'], last['id'])
+    return conversations, next_cursor
+
+@timed('db_seconds')
+@retry_on_locked
+def list_archived_conversations(page_size: int = 25, before_id: int = None, user_id: str = None) -> tuple:
+    """
+    Return one page of conversations moved out by retention.py, newest id first,
+    and the cursor of the next page.
+
+    Only the index is read; the messages stay in the archive segments until
+    get_conversation_by_id asks for one conversation.
+    """
+    conditions, params = [], []
+    if user_id:
+        conditions.append('user_id = ?')
+        params.append(user_id)
+    if before_id is not None:
+        conditions.append('id < ?')
+        params.append(before_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    with connection() as conn:
+        rows = conn.execute(f'''
+            SELECT id, user_id, session_id, message_count, last_updated FROM archived_conversations
+            {where}
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (*params, page_size + 1)).fetchall()
+
+    conversations = [dict(zip(('id', 'user_id', 'session_id', 'message_count', 'last_updated'), row))
+                     for row in rows[:page_size]]
+    next_cursor = conversations[-1]['id'] if len(rows) > page_size else None
+    return conversations, next_cursor
+
+@timed('db_seconds')
+@retry_on_locked
+def get_conversation_users() -> list:
+    """Get every user that has at least one conversation."""
+    with connection() as conn:
+        rows = conn.execute('SELECT DISTINCT user_id FROM conversations ORDER BY user_id').fetchall()
+    return [row[0] for row in rows]
+
+@timed('db_seconds')
+@retry_on_locked
+def get_conversation_by_id(conv_id: int) -> dict:
+    """Retrieve a conversation and its messages by its ID, from the archive if it has been moved there."""
+    with connection() as conn:
+        result = conn.execute('SELECT user_id, session_id, last_updated FROM conversations WHERE id = ?', (conv_id,)).fetchone()
+        archived = None if result else conn.execute(
+            'SELECT user_id, segment, offset, length FROM archived_conversations WHERE id = ?', (conv_id,)
+        ).fetchone()
+
+    if result:
+        user_id, session_id, last_updated = result
+        return {
+            'id': conv_id,
+            'user_id': user_id,
+            'session_id': session_id,
+            'messages': get_messages(conv_id),
+            'last_updated': last_updated
+        }
+    if archived:
+        record = read_record(*archived[1:])
+        return {
+            'id': conv_id,
+            # The index, not the record, follows update_conversations.py
+            'user_id': archived[0],
+            'session_id': record['session_id'],
+            'messages': record['messages'],
+            'last_updated': record['last_updated'],
+            'archived': True
+        }
+    return None
+
+# Control characters mark snippet matches until the text has been escaped
+_MATCH_START, _MATCH_END = '\x02', '\x03'
+
+def _fts_query(text: str) -> str:
+    """Quote every term so user input is never parsed as FTS5 query syntax."""
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+@timed('db_seconds')
+@retry_on_locked
+def search_messages(query: str, user_id: str = None, role: str = None,
+                    date_from: str = None, date_to: str = None, limit: int = 50) -> list:
+    """
+    Full-text search over all message content, best matches first.
+
+    Each result carries an HTML-escaped snippet with the matched terms wrapped
+    in <mark>. Dates are 'YYYY-MM-DD' strings and both ends are inclusive.
+    """
+    match = _fts_query(query)
+    if not match:
+        return []
+
+    conditions, params = ['messages_fts MATCH ?'], [match]
+    if user_id:
+        conditions.append('c.user_id = ?')
+        params.append(user_id)
+    if role:
+        conditions.append('f.role = ?')
+        params.append(role)
+    if date_from:
+        conditions.append('substr(f.timestamp, 1, 10) >= ?')
+        params.append(date_from)
+    if date_to:
+        conditions.append('substr(f.timestamp, 1, 10) <= ?')
+        params.append(date_to)
+
+    with connection() as conn:
+        rows = conn.execute(f'''
+            SELECT f.conversation_id, f.seq, f.role, f.timestamp, c.user_id,
+                   snippet(messages_fts, 0, '{_MATCH_START}', '{_MATCH_END}', '…', 16)
+            FROM messages_fts f JOIN conversations c ON c.id = f.conversation_id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY bm25(messages_fts)
+            LIMIT ?
+        ''', (*params, limit)).fetchall()
+
+    return [{
+        'conversation_id': conversation_id,
+        'seq': seq,
+        'role': role,
+        'timestamp': timestamp,
+        'user_id': user_id,
+        'snippet': html.escape(snippet).replace(_MATCH_START, '<mark>').replace(_MATCH_END, '</mark>')
+    } for conversation_id, seq, role, timestamp, user_id, snippet in rows]
+
+def _first_day(days: int) -> str:
+    return (datetime.now() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+
+@timed('db_seconds')
+@retry_on_locked
+def get_daily_activity(days: int = 30) -> list:
+    """Return the activity rollup of each day with activity in the last days, oldest first."""
+    with connection() as conn:
+        rows = conn.execute('''
+            SELECT day, messages, user_messages, conversations_started, active_users,
+                   langflow_calls, langflow_errors, langflow_seconds, langflow_max_seconds
+            FROM daily_activity WHERE day >= ? ORDER BY day
+        ''', (_first_day(days),)).fetchall()
+
+    return [{
+        'day': day,
+        'messages': messages,
+        'user_messages': user_messages,
+        'conversations_started': conversations_started,
+        'active_users': active_users,
+        'langflow_calls': langflow_calls,
+        'langflow_errors': langflow_errors,
+        'langflow_mean_seconds': langflow_seconds / langflow_calls if langflow_calls else None,
+        'langflow_max_seconds': langflow_max_seconds if langflow_calls else None
+    } for (day, messages, user_messages, conversations_started, active_users,
+           langflow_calls, langflow_errors, langflow_seconds, langflow_max_seconds) in rows]
+
+@timed('db_seconds')
+@retry_on_locked
+def get_activity_totals(days: int = 30) -> dict:
+    """Sum the activity rollups over the last days.
+
+    Active users are the distinct users seen in the period, not the sum of
+    the daily counts.
+    """
+    first_day = _first_day(days)
+    with connection() as conn:
+        messages, user_messages, started, calls, errors, seconds = conn.execute('''
+            SELECT COALESCE(SUM(messages), 0), COALESCE(SUM(user_messages), 0),
+                   COALESCE(SUM(conversations_started), 0), COALESCE(SUM(langflow_calls), 0),
+                   COALESCE(SUM(langflow_errors), 0), COALESCE(SUM(langflow_seconds), 0)
+            FROM daily_activity WHERE day >= ?
+        ''', (first_day,)).fetchone()
+        active_users = conn.execute('SELECT COUNT(*) FROM user_activity WHERE last_active >= ?',
+                                    (first_day,)).fetchone()[0]
+
+    return {
+        'messages': messages,
+        'user_messages': user_messages,
+        'conversations_started': started,
+        'active_users': active_users,
+        'turns_per_conversation': user_messages / started if started else None,
+        'langflow_calls': calls,
+        'langflow_errors': errors,
+        'langflow_mean_seconds': seconds / calls if calls else None
+    }
+
+@timed('db_seconds')
+@retry_on_locked
+def get_top_users(limit: int = 10) -> list:
+    """Return the users with the most messages of all time."""
+    with connection() as conn:
+        rows = conn.execute('''
+            SELECT user_id, messages, user_messages, conversations, first_active, last_active
+            FROM user_activity ORDER BY messages DESC LIMIT ?
+        ''', (limit,)).fetchall()
+
+    return [{
+        'user_id': user_id,
+        'messages': messages,
+        'user_messages': user_messages,
+        'conversations': conversations,
+        'first_active': first_active,
+        'last_active': last_active
+    } for user_id, messages, user_messages, conversations, first_active, last_active in rows]
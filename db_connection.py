@@ -0,0 +1,157 @@
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from metrics import observe
+
+# Path of the conversations database, overridable for tests and deployments
+DB_PATH = os.environ.get('CONVERSATIONS_DB_PATH', 'conversations.db')
+
+# How long SQLite itself waits on a lock before raising "database is locked"
+BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+
+# Retries on top of the busy timeout, with jittered exponential backoff
+LOCK_RETRIES = int(os.environ.get('SQLITE_LOCK_RETRIES', '5'))
+LOCK_RETRY_BASE_DELAY = 0.05
+
+# Idle connections kept open per database file
+POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', '8'))
+
+# Negative cache_size is in KiB, so this is a 16 MB page cache per connection
+CACHE_SIZE_KIB = int(os.environ.get('SQLITE_CACHE_SIZE_KIB', '16000'))
+
+_pools = {}
+_pools_lock = threading.Lock()
+_local = threading.local()
+
+# Time spent waiting for the write lock, for benchmarks and monitoring
+_lock_stats = {'waits': 0, 'wait_seconds': 0.0, 'retries': 0, 'retry_sleep_seconds': 0.0}
+_lock_stats_lock = threading.Lock()
+
+def _open_connection(db_path: str) -> sqlite3.Connection:
+    """Open a new connection and apply the pragmas every connection should use."""
+    # isolation_level=None leaves transaction control to transaction(), and
+    # check_same_thread=False lets a pooled connection move between script runs
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000,
+                           isolation_level=None, check_same_thread=False)
+    # Only takes effect on a new database, and only before WAL is switched
+    # on; freed pages can then be returned in small steps (retention.py)
+    # instead of by a full VACUUM
+    conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    # WAL lets readers proceed while a writer holds the lock
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KIB}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    return conn
+
+def _get_pool(db_path: str) -> queue.LifoQueue:
+    with _pools_lock:
+        if db_path not in _pools:
+            _pools[db_path] = queue.LifoQueue(maxsize=POOL_SIZE)
+        return _pools[db_path]
+
+@contextmanager
+def connection(db_path: str = None):
+    """Check out a pooled connection for the current thread.
+
+    Nested calls on the same thread reuse the connection that is already
+    checked out, so helpers can be composed inside a single transaction.
+    """
+    db_path = db_path or DB_PATH
+    held = getattr(_local, 'held', None)
+    if held is None:
+        held = _local.held = {}
+
+    if db_path in held:
+        yield held[db_path]
+        return
+
+    pool = _get_pool(db_path)
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        conn = _open_connection(db_path)
+
+    held[db_path] = conn
+    try:
+        yield conn
+    finally:
+        del held[db_path]
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+@contextmanager
+def transaction(db_path: str = None):
+    """Run a block inside a write transaction, committing on success.
+
+    BEGIN IMMEDIATE takes the write lock up front, which avoids the deadlock
+    SQLite reports when two readers both try to upgrade to writers.
+    """
+    with connection(db_path) as conn:
+        if conn.in_transaction:
+            # Already inside an outer transaction on this thread
+            yield conn
+            return
+        started = time.perf_counter()
+        conn.execute('BEGIN IMMEDIATE')
+        waited = time.perf_counter() - started
+        with _lock_stats_lock:
+            _lock_stats['waits'] += 1
+            _lock_stats['wait_seconds'] += waited
+        observe('sqlite_lock_wait_seconds', waited)
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.execute('COMMIT')
+
+def _is_lock_error(error: sqlite3.OperationalError) -> bool:
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+def retry_on_locked(func):
+    """Retry a database function with jittered backoff while the DB is locked."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(LOCK_RETRIES + 1):
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                # Never retry from inside an outer transaction; let it roll back
+                if not _is_lock_error(e) or attempt == LOCK_RETRIES or getattr(_local, 'held', None):
+                    raise
+                delay = LOCK_RETRY_BASE_DELAY * (2 ** attempt) * random.uniform(0.5, 1.5)
+                with _lock_stats_lock:
+                    _lock_stats['retries'] += 1
+                    _lock_stats['retry_sleep_seconds'] += delay
+                time.sleep(delay)
+    return wrapper
+
+def lock_stats() -> dict:
+    """Return how often and how long writers have waited for the write lock."""
+    with _lock_stats_lock:
+        return dict(_lock_stats)
+
+def close_all():
+    """Close every idle pooled connection."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        while True:
+            try:
+                pool.get_nowait().close()
+            except queue.Empty:
+                break
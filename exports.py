@@ -0,0 +1,233 @@
+import csv
+import importlib.util
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+import streamlit as st
+from archive_segments import read_record
+from database import decode_content, get_conversation_by_id
+from db_connection import connection, retry_on_locked
+
+EXPORT_DIR = os.environ.get('EXPORT_DIR', 'exports')
+EXPORT_FORMATS = ['csv', 'jsonl', 'parquet']
+EXPORT_CHUNK_SIZE = 1000
+
+# Finished exports older than this are deleted when the next one starts
+EXPORT_MAX_AGE_HOURS = float(os.environ.get('EXPORT_MAX_AGE_HOURS', '24'))
+
+EXPORT_COLUMNS = ['conversation_id', 'user_id', 'session_id', 'seq', 'role', 'timestamp', 'content']
+
+def available_formats() -> List[str]:
+    """Export formats usable in this environment; Parquet needs the optional pyarrow."""
+    if importlib.util.find_spec('pyarrow') is None:
+        return [fmt for fmt in EXPORT_FORMATS if fmt != 'parquet']
+    return list(EXPORT_FORMATS)
+
+def conversation_csv(conv_id: int) -> str:
+    """Build the CSV download of a single conversation."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['Timestamp', 'Role', 'Content'])
+    written = 0
+    for rows in iter_message_rows(conversation_id=conv_id):
+        for row in rows:
+            writer.writerow([row[5] or 'No timestamp', row[4], row[6]])
+        written += len(rows)
+    if not written:
+        # Archived conversations are no longer in the messages table
+        conversation = get_conversation_by_id(conv_id)
+        for msg in conversation['messages'] if conversation else []:
+            writer.writerow([msg.get('timestamp') or 'No timestamp', msg['role'], msg['content']])
+    return buffer.getvalue()
+
+@retry_on_locked
+def _fetch_chunk(after: tuple, user_id: Optional[str], conversation_id: Optional[int], chunk_size: int) -> list:
+    conditions, params = ['(m.conversation_id, m.seq) > (?, ?)'], list(after)
+    if user_id:
+        conditions.append('c.user_id = ?')
+        params.append(user_id)
+    if conversation_id is not None:
+        conditions.append('m.conversation_id = ?')
+        params.append(conversation_id)
+
+    with connection() as conn:
+        return conn.execute(f'''
+            SELECT m.conversation_id, c.user_id, c.session_id, m.seq, m.role, m.timestamp, m.content, m.content_format
+            FROM messages m JOIN conversations c ON c.id = m.conversation_id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY m.conversation_id, m.seq
+            LIMIT ?
+        ''', (*params, chunk_size)).fetchall()
+
+def iter_message_rows(user_id: Optional[str] = None, conversation_id: Optional[int] = None,
+                      chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """
+    Yield message rows in chunks, ordered by conversation and sequence.
+
+    Each chunk is a separate keyset query, so only one chunk is held in
+    memory and no read transaction stays open between chunks.
+    """
+    after = (-1, -1)
+    while True:
+        rows = _fetch_chunk(after, user_id, conversation_id, chunk_size)
+        if not rows:
+            return
+        yield [(*row[:6], decode_content(row[6], row[7])) for row in rows]
+        after = (rows[-1][0], rows[-1][3])
+
+@retry_on_locked
+def _fetch_archived(after_id: int, user_id: Optional[str], limit: int) -> list:
+    conditions, params = ['id > ?'], [after_id]
+    if user_id:
+        conditions.append('user_id = ?')
+        params.append(user_id)
+
+    with connection() as conn:
+        return conn.execute(f'''
+            SELECT id, user_id, segment, offset, length FROM archived_conversations
+            WHERE {' AND '.join(conditions)}
+            ORDER BY id
+            LIMIT ?
+        ''', (*params, limit)).fetchall()
+
+def iter_archived_rows(user_id: Optional[str] = None, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """
+    Yield the message rows of archived conversations, shaped and chunked like iter_message_rows.
+
+    The index is walked in id order and each record is read from its
+    segment, so at most one conversation beyond the current chunk is held
+    in memory.
+    """
+    after_id, rows = -1, []
+    while True:
+        locations = _fetch_archived(after_id, user_id, chunk_size)
+        if not locations:
+            break
+        for conv_id, owner, segment, offset, length in locations:
+            record = read_record(segment, offset, length)
+            # The index, not the record, follows update_conversations.py
+            rows.extend((conv_id, owner, record['session_id'], seq, msg['role'],
+                         msg.get('timestamp'), msg['content'])
+                        for seq, msg in enumerate(record['messages']))
+            if len(rows) >= chunk_size:
+                yield rows
+                rows = []
+        after_id = locations[-1][0]
+    if rows:
+        yield rows
+
+def iter_all_message_rows(user_id: Optional[str] = None,
+                          chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """
+    Yield the rows of live and archived conversations alike.
+
+    Live rows come first: a conversation archived while they are read is then
+    at worst exported twice, never left out.
+    """
+    return itertools.chain(iter_message_rows(user_id=user_id, chunk_size=chunk_size),
+                           iter_archived_rows(user_id=user_id, chunk_size=chunk_size))
+
+def _write_csv(member, chunks):
+    with io.TextIOWrapper(member, encoding='utf-8', newline='') as text:
+        writer = csv.writer(text)
+        writer.writerow(EXPORT_COLUMNS)
+        for rows in chunks:
+            writer.writerows(rows)
+
+def _write_jsonl(member, chunks):
+    with io.TextIOWrapper(member, encoding='utf-8') as text:
+        for rows in chunks:
+            for row in rows:
+                text.write(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + '\n')
+
+def _write_parquet(archive: zipfile.ZipFile, name: str, chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('conversation_id', pa.int64()), ('user_id', pa.string()), ('session_id', pa.string()),
+        ('seq', pa.int64()), ('role', pa.string()), ('timestamp', pa.string()), ('content', pa.string()),
+    ])
+    # Parquet needs a seekable sink, so row groups go to a temp file first
+    with tempfile.NamedTemporaryFile(suffix='.parquet', dir=EXPORT_DIR) as tmp:
+        with pq.ParquetWriter(tmp.name, schema, compression='zstd') as writer:
+            for rows in chunks:
+                columns = list(zip(*rows))
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                    schema=schema
+                ))
+        archive.write(tmp.name, name)
+
+def remove_export(path: str):
+    """Delete a finished export once it is no longer offered for download."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def remove_old_exports(max_age_hours: float = EXPORT_MAX_AGE_HOURS) -> int:
+    """Delete exports older than max_age_hours, such as those of sessions that ended; returns how many."""
+    if not os.path.isdir(EXPORT_DIR):
+        return 0
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        if name.startswith('conversations_') and name.endswith('.zip') and os.path.getmtime(path) < cutoff:
+            remove_export(path)
+            removed += 1
+    return removed
+
+def write_export(fmt: str, user_id: Optional[str] = None) -> str:
+    """
+    Export all conversations, or one user's, to a zip file and return its path.
+
+    Rows are streamed from SQLite, then from the retention archive, in chunks
+    straight into the compressed zip, so memory use does not depend on the
+    size of the export.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    remove_old_exports()
+
+    scope = user_id or 'all'
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    path = os.path.join(EXPORT_DIR, f"conversations_{scope}_{stamp}.{fmt}.zip")
+    member_name = f"conversations_{scope}.{fmt}"
+    chunks = iter_all_message_rows(user_id=user_id)
+
+    try:
+        with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            if fmt == 'parquet':
+                _write_parquet(archive, member_name, chunks)
+            else:
+                with archive.open(member_name, 'w', force_zip64=True) as member:
+                    if fmt == 'csv':
+                        _write_csv(member, chunks)
+                    else:
+                        _write_jsonl(member, chunks)
+    except BaseException:
+        remove_export(path)
+        raise
+    return path
+
+@st.cache_resource
+def get_export_executor() -> ProcessPoolExecutor:
+    """Return the process pool that runs bulk exports off the Streamlit server process."""
+    # spawn rather than fork, so workers never inherit pooled SQLite connections
+    return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+
+def submit_export(fmt: str, user_id: Optional[str] = None) -> Future:
+    """Start a bulk export in the worker process; the future resolves to the zip path."""
+    return get_export_executor().submit(write_export, fmt, user_id)
@@ -0,0 +1,74 @@
+import os
+from typing import List, Optional, Tuple
+
+# Total characters of history sent to LangFlow (roughly 4 characters per token)
+HISTORY_CHAR_BUDGET = int(os.environ.get('HISTORY_CHAR_BUDGET', '8000'))
+
+# Most recent messages sent verbatim; older ones are folded into the summary
+HISTORY_KEEP_MESSAGES = int(os.environ.get('HISTORY_KEEP_MESSAGES', '6'))
+
+# Upper bound on the running summary, and on each folded message within it
+SUMMARY_CHAR_BUDGET = int(os.environ.get('SUMMARY_CHAR_BUDGET', '2000'))
+SUMMARY_LINE_CHARS = 200
+
+def strip_message(message: dict) -> dict:
+    """Keep only the fields the model needs, dropping timestamp, user and the like."""
+    return {'role': message['role'], 'content': message['content']}
+
+def _summary_line(message: dict) -> str:
+    speaker = 'User' if message['role'] == 'user' else 'Assistant'
+    content = ' '.join(message['content'].split())
+    if len(content) > SUMMARY_LINE_CHARS:
+        content = content[:SUMMARY_LINE_CHARS].rsplit(' ', 1)[0] + '...'
+    return f"{speaker}: {content}"
+
+def fold_into_summary(summary: Optional[str], messages: List[dict]) -> str:
+    """Fold messages into the running summary, dropping the oldest lines past the budget."""
+    lines = summary.split('\n') if summary else []
+    lines.extend(_summary_line(message) for message in messages)
+    while len(lines) > 1 and sum(len(line) + 1 for line in lines) > SUMMARY_CHAR_BUDGET:
+        lines.pop(0)
+    return '\n'.join(lines)
+
+def compact_history(history: List[dict], summary: Optional[str] = None,
+                    summarized_upto: int = 0, offset: int = 0) -> Tuple[List[dict], Optional[str], int]:
+    """
+    Reduce a conversation history to a bounded payload for LangFlow.
+
+    The most recent messages are kept verbatim as long as they fit the char
+    budget. Everything older is folded into a running summary. The summary is
+    returned with the index it covers, so the caller can store both and later
+    turns only fold the messages that have aged out since.
+
+    Args:
+        history: Conversation history, oldest first
+        summary: Running summary from a previous turn, if any
+        summarized_upto: Number of leading messages already folded into summary
+        offset: Position of history[0] in the conversation, when only the tail
+            from summarized_upto onwards is passed in
+
+    Returns:
+        The payload history, the updated summary and the updated summarized_upto
+    """
+    end = offset + len(history)
+    recent_start = max(summarized_upto, end - HISTORY_KEEP_MESSAGES)
+    recent = [strip_message(message) for message in history[recent_start - offset:]]
+
+    # Age out more messages while the verbatim part overflows the budget,
+    # always keeping at least the latest one
+    budget = HISTORY_CHAR_BUDGET - SUMMARY_CHAR_BUDGET
+    while len(recent) > 1 and sum(len(message['content']) for message in recent) > budget:
+        recent.pop(0)
+        recent_start += 1
+    if recent and len(recent[0]['content']) > budget:
+        recent[0]['content'] = recent[0]['content'][-budget:]
+
+    if recent_start > summarized_upto:
+        summary = fold_into_summary(summary, history[summarized_upto - offset:recent_start - offset])
+        summarized_upto = recent_start
+
+    payload = []
+    if summary:
+        payload.append({'role': 'system', 'content': f"Summary of the earlier conversation:\n{summary}"})
+    payload.extend(recent)
+    return payload, summary, summarized_upto
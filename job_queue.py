@@ -0,0 +1,207 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional
+
+import streamlit as st
+from database import get_conversation_summary, get_messages_since
+from history_compaction import compact_history
+from langflow_client import LangFlowClient, extract_response_text, get_langflow_client
+from metrics import observe
+from response_cache import ResponseCache, get_response_cache, make_cache_key
+from write_behind import TurnWriter
+
+# LangFlow requests in flight at once across all sessions; one worker thread each
+MAX_IN_FLIGHT = int(os.environ.get('LANGFLOW_MAX_IN_FLIGHT', '8'))
+
+# Turns allowed to wait for a worker before new ones are turned away
+MAX_QUEUED = int(os.environ.get('LANGFLOW_MAX_QUEUED', '100'))
+
+# Finished jobs kept around for their pages to pick up the result
+FINISHED_JOBS_KEPT = 1000
+
+class QueueFullError(RuntimeError):
+    """Raised when too many turns are already waiting for a worker."""
+
+class Job:
+    """One unit of work and its progress, shared between a worker and the page polling it."""
+
+    def __init__(self, key: str, func, args: tuple):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.func = func
+        self.args = args
+        self.status = 'queued'  # queued, running, done or failed
+        self.partial = ''
+        self.result = None
+        self.error = None
+        self.submitted_at = time.monotonic()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('done', 'failed')
+
+    def emit(self, chunk: str):
+        """Make part of the result visible to the page before the job finishes."""
+        self.partial += chunk
+
+class JobQueue:
+    """
+    Bounded worker pool that runs jobs in submission order per key.
+
+    At most one job per key is handed to the pool at a time, so a user's
+    turns reach LangFlow one after another, while different users' turns
+    run in parallel up to the number of workers.
+    """
+
+    def __init__(self, workers: int = MAX_IN_FLIGHT, max_queued: int = MAX_QUEUED):
+        self.workers = workers
+        self.max_queued = max_queued
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='langflow-worker')
+        self._lock = threading.Lock()
+        # Jobs waiting behind an earlier job with the same key
+        self._waiting = {}
+        self._jobs = OrderedDict()
+        self._stats = {'queued': 0, 'running': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+
+    def submit(self, key: str, func, *args) -> Job:
+        """Queue func(job, *args) behind any unfinished job with the same key."""
+        with self._lock:
+            if self._stats['queued'] >= self.max_queued:
+                self._stats['rejected'] += 1
+                raise QueueFullError("Too many requests are waiting, please try again shortly")
+            job = Job(key, func, args)
+            self._jobs[job.id] = job
+            self._trim()
+            self._stats['queued'] += 1
+            if key in self._waiting:
+                self._waiting[key].append(job)
+                return job
+            self._waiting[key] = deque()
+        self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job: Job):
+        started = time.monotonic()
+        observe('job_queue_wait_seconds', started - job.submitted_at)
+        with self._lock:
+            self._stats['queued'] -= 1
+            self._stats['running'] += 1
+        job.status = 'running'
+        try:
+            job.result = job.func(job, *job.args)
+            job.status = 'done'
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            with self._lock:
+                self._stats['running'] -= 1
+                self._stats['completed' if job.status == 'done' else 'failed'] += 1
+                waiting = self._waiting[job.key]
+                next_job = waiting.popleft() if waiting else None
+                if next_job is None:
+                    del self._waiting[job.key]
+            if next_job is not None:
+                self._executor.submit(self._run, next_job)
+
+    def _trim(self):
+        # Forget the oldest finished jobs; unfinished ones are always kept
+        excess = len(self._jobs) - FINISHED_JOBS_KEPT
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id].done:
+                del self._jobs[job_id]
+                excess -= 1
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        """Return queue depth, in-flight count and totals."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['users_waiting'] = sum(1 for waiting in self._waiting.values() if waiting)
+        stats['workers'] = self.workers
+        stats['max_queued'] = self.max_queued
+        return stats
+
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    """Return the process-wide LangFlow job queue."""
+    return JobQueue()
+
+def prepare_history(writer: TurnWriter) -> List[dict]:
+    """Compact the stored history sent to LangFlow, keeping the running summary up to date."""
+    summary, summary_upto = get_conversation_summary(writer.user_id, writer.session_id)
+    # Only messages not yet folded into the summary are needed; the current
+    # message is still in the writer, so it is not among them
+    history = get_messages_since(writer.user_id, writer.session_id, summary_upto)
+    payload_history, new_summary, new_upto = compact_history(history, summary, summary_upto, offset=summary_upto)
+    if new_upto != summary_upto:
+        writer.set_summary(new_summary, new_upto)
+    return payload_history
+
+def answer_turn(job: Job, username: str, session_id: str, message: dict, client: LangFlowClient,
+                response_cache: Optional[ResponseCache], stream: bool) -> str:
+    """
+    Get LangFlow's answer to a user message.
+
+    The message, the answer and any summary update are stored together in
+    one transaction when the turn ends; if the turn fails, the message is
+    still stored.
+    """
+    with TurnWriter(username, session_id) as writer:
+        # Send a bounded window of the history, excluding the current message
+        payload_history = prepare_history(writer)
+        writer.add(message)
+
+        # Identical prompts with identical history can skip LangFlow entirely
+        prompt = message["content"]
+        cache_key = make_cache_key(prompt, client.endpoint, payload_history)
+        response_text = response_cache.get(cache_key) if response_cache else None
+
+        if response_text is None:
+            # Timed here as well, for the latency trend in the activity rollups
+            started = time.perf_counter()
+            try:
+                if stream:
+                    # The polling page shows the answer as it arrives
+                    for chunk in client.stream_flow(prompt, history=payload_history):
+                        job.emit(chunk)
+                    response_text = job.partial
+                else:
+                    response_text = extract_response_text(client.run_flow(prompt, history=payload_history))
+            except Exception:
+                writer.record_langflow(time.perf_counter() - started, failed=True)
+                raise
+            writer.record_langflow(time.perf_counter() - started)
+            if response_cache:
+                response_cache.put(cache_key, response_text)
+
+        writer.add({
+            "role": "assistant",
+            "content": response_text,
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "user": None
+        })
+    return response_text
+
+def submit_turn(username: str, session_id: str, message: dict, stream: bool = False) -> Job:
+    """
+    Answer a user message on a worker thread instead of the script thread.
+
+    The worker stores the message with the answer, so nothing is written
+    for a turn the queue turns away. The client and cache are resolved here, on the
+    script thread, and handed to the worker.
+    """
+    return get_job_queue().submit(
+        username, answer_turn, username, session_id, message,
+        get_langflow_client(), get_response_cache(), stream
+    )
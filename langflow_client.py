@@ -0,0 +1,257 @@
+import json
+import os
+import random
+import threading
+import time
+from typing import Iterator, List, Optional
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+from metrics import timed
+
+class CircuitOpenError(RuntimeError):
+    """Raised when LangFlow has failed repeatedly and calls are being refused."""
+
+class CircuitBreaker:
+    """Fail fast after repeated failures, then let a single trial call through."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        """Return whether a call may go to the backend right now."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            # Half-open: let one call probe whether the backend is back
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+def build_payload(message: str, agent_name: str = "User_1", history: Optional[List[dict]] = None) -> dict:
+    """Build the LangFlow run payload for a message and its conversation history."""
+    payload = {
+        "input_value": message,
+        "output_type": "chat",
+        "input_type": "chat",
+        "user": agent_name,  # Pass the user name to LangFlow
+        "session_id": agent_name
+    }
+    # Include conversation history if available
+    if history and len(history) > 0:
+        # Format history in the way LangFlow expects it
+        payload["conversation_history"] = json.dumps(history)
+    return payload
+
+def extract_response_text(response_data: dict) -> str:
+    """Extract the chat message text from a LangFlow run result."""
+    return response_data["outputs"][0]["outputs"][0]["results"]["message"]["text"]
+
+class LangFlowClient:
+    """
+    Pooled HTTP client for the LangFlow run API.
+
+    One instance is shared by every Streamlit session, so TCP/TLS connections
+    are kept alive between turns. Every call is bounded by connect and read
+    timeouts. Connection errors and 5xx responses are retried with exponential
+    backoff; read timeouts are not, since the flow may still be running. A
+    circuit breaker refuses calls while LangFlow is down.
+    """
+
+    def __init__(self, base_url: str, endpoint: str, token: Optional[str] = None,
+                 connect_timeout: float = 5.0, read_timeout: float = 120.0,
+                 max_retries: int = 2, backoff: float = 0.5,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 pool_size: int = 20):
+        self.base_url = base_url
+        self.endpoint = endpoint
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "errors": 0,
+            "retries": 0,
+            "rejected": 0,
+            "latency_total": 0.0,
+            "latency_last": 0.0,
+        }
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for key, value in increments.items():
+                self._stats[key] += value
+
+    def stats(self) -> dict:
+        """Return request, error and latency counters for this client."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        succeeded = stats["requests"] - stats["errors"]
+        stats["latency_avg"] = stats["latency_total"] / succeeded if succeeded else 0.0
+        stats["circuit"] = self.breaker.state
+        return stats
+
+    def _post(self, payload: dict, stream: bool = False) -> requests.Response:
+        """POST to the run endpoint with retries, returning a successful response."""
+        if not self.breaker.allow():
+            self._count(rejected=1)
+            raise CircuitOpenError("LangFlow is unavailable, please try again shortly")
+
+        url = f"{self.base_url}/api/v1/run/{self.endpoint}"
+        params = {"stream": "true"} if stream else None
+        self._count(requests=1)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(url, json=payload, params=params,
+                                             timeout=self.timeout, stream=stream)
+                if response.status_code < 500:
+                    response.raise_for_status()
+                    return response
+                response.close()
+                error = requests.HTTPError(f"LangFlow returned {response.status_code}", response=response)
+            except requests.ReadTimeout:
+                # The flow may already be running on the server; posting it again
+                # could run it twice, so only failures to connect are retried
+                self._count(errors=1)
+                self.breaker.record_failure()
+                raise
+            except requests.ConnectionError as e:
+                # Includes ConnectTimeout
+                error = e
+            except requests.HTTPError:
+                # 4xx means the request itself is wrong; retrying will not help,
+                # but the backend did answer, so it counts as up for the breaker
+                self._count(errors=1)
+                self.breaker.record_success()
+                raise
+
+            if attempt == self.max_retries:
+                break
+            self._count(retries=1)
+            time.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+        self._count(errors=1)
+        self.breaker.record_failure()
+        raise error
+
+    @timed('langflow_seconds')
+    def run_flow(self, message: str, agent_name: str = "User_1", history: Optional[List[dict]] = None) -> dict:
+        """Run the flow and return LangFlow's full JSON result."""
+        started = time.perf_counter()
+        response = self._post(build_payload(message, agent_name, history))
+        try:
+            response_data = response.json()
+        except ValueError:
+            self._count(errors=1)
+            self.breaker.record_failure()
+            raise
+        self._record_latency(started)
+        return response_data
+
+    @timed('langflow_seconds')
+    def stream_flow(self, message: str, agent_name: str = "User_1", history: Optional[List[dict]] = None) -> Iterator[str]:
+        """
+        Run the flow in streaming mode, yielding the response text as it is generated.
+
+        LangFlow's streaming run endpoint emits one JSON event per line: "token"
+        events carry the next chunk of text and the "end" event carries the full
+        result. Flows whose model does not stream only send the "end" event, in
+        which case the whole answer is yielded at once.
+        """
+        started = time.perf_counter()
+        with self._post(build_payload(message, agent_name, history), stream=True) as response:
+            streamed_any = False
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line:
+                        continue
+                    # Tolerate server-sent-events framing as well as bare JSON lines
+                    if line.startswith("data:"):
+                        line = line[len("data:"):].strip()
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+
+                    if event.get("event") == "token":
+                        chunk = event.get("data", {}).get("chunk")
+                        if chunk:
+                            streamed_any = True
+                            yield chunk
+                    elif event.get("event") == "end":
+                        if not streamed_any:
+                            yield extract_response_text(event["data"]["result"])
+                        self._record_latency(started)
+                        return
+                    elif event.get("event") == "error":
+                        raise RuntimeError(event.get("data", {}).get("error", "LangFlow stream failed"))
+            except Exception:
+                self._count(errors=1)
+                self.breaker.record_failure()
+                raise
+        # The stream closed without an end event; whatever arrived is the answer
+        self._record_latency(started)
+
+    def _record_latency(self, started: float):
+        latency = time.perf_counter() - started
+        self.breaker.record_success()
+        self._count(latency_total=latency)
+        with self._stats_lock:
+            self._stats["latency_last"] = latency
+
+@st.cache_resource
+def get_langflow_client() -> LangFlowClient:
+    """Return the process-wide LangFlow client, configured from the environment."""
+    return LangFlowClient(
+        base_url=os.environ.get("BASE_API_URL"),
+        endpoint=os.environ.get("ENDPOINT"),
+        token=os.environ.get("APPLICATION_TOKEN"),
+        connect_timeout=float(os.environ.get("LANGFLOW_CONNECT_TIMEOUT", "5")),
+        read_timeout=float(os.environ.get("LANGFLOW_READ_TIMEOUT", "120")),
+        max_retries=int(os.environ.get("LANGFLOW_MAX_RETRIES", "2")),
+        backoff=float(os.environ.get("LANGFLOW_RETRY_BACKOFF", "0.5")),
+        failure_threshold=int(os.environ.get("LANGFLOW_BREAKER_THRESHOLD", "5")),
+        reset_timeout=float(os.environ.get("LANGFLOW_BREAKER_RESET", "30")),
+    )
@@ -0,0 +1,73 @@
+import html
+import os
+import threading
+from collections import OrderedDict
+from typing import List
+
+# Rendered messages kept across reruns and sessions
+RENDER_CACHE_SIZE = int(os.environ.get('RENDER_CACHE_SIZE', '5000'))
+
+_TEMPLATES = {
+    # Chat page: compact lines, user messages highlighted
+    'chat': {
+        'user': "<div style='color: orange'><b>You</b>: {content}</div><br>",
+        'assistant': "<div><b>Assistant:</b> {content}</div><br>",
+    },
+    # Admin pages: one grey card per message, with its timestamp
+    'admin': {
+        'user': """<div style='background-color: #e0e0e0; padding: 10px; border-radius: 5px; margin: 5px 0; color: #000000;'>
+<b>User</b> ({timestamp}):<br>
+{content}
+</div>""",
+        'assistant': """<div style='background-color: #e0e0e0; padding: 10px; border-radius: 5px; margin: 5px 0; color: #000000;'>
+<b>Assistant</b> ({timestamp}):<br>
+{content}
+</div>""",
+    },
+}
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+def sanitize(content: str) -> str:
+    """Escape message text so it can never inject markup into the page."""
+    return html.escape(content).replace('\n', '<br>')
+
+def render_message(conversation_key, index: int, message: dict, style: str = 'chat') -> str:
+    """
+    Return the HTML for one message, formatting it only the first time it is seen.
+
+    Entries are keyed on the conversation, the message's position and a hash of
+    its content, so an edited message is never served stale.
+    """
+    key = (style, conversation_key, index, hash(message['content']))
+    with _cache_lock:
+        rendered = _cache.get(key)
+        if rendered is not None:
+            _cache.move_to_end(key)
+            _stats['hits'] += 1
+            return rendered
+
+    template = _TEMPLATES[style]['user' if message['role'] == 'user' else 'assistant']
+    rendered = template.format(
+        content=sanitize(message['content']),
+        timestamp=html.escape(message.get('timestamp') or 'No timestamp')
+    )
+
+    with _cache_lock:
+        _stats['misses'] += 1
+        _cache[key] = rendered
+        while len(_cache) > RENDER_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return rendered
+
+def render_messages(conversation_key, messages: List[dict], start_index: int = 0, style: str = 'chat') -> str:
+    """Return the HTML for a run of messages, the first at position start_index."""
+    return ''.join(render_message(conversation_key, start_index + i, message, style)
+                   for i, message in enumerate(messages))
+
+def cache_stats() -> dict:
+    """Return hit and miss counts and the current size of the render cache."""
+    with _cache_lock:
+        return dict(_stats, size=len(_cache))
@@ -0,0 +1,171 @@
+import importlib.util
+import itertools
+import os
+import tempfile
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from database import decode_content
+from db_connection import connection, retry_on_locked
+from exports import get_export_executor, iter_archived_rows
+
+SNAPSHOT_PATH = os.environ.get('MESSAGE_SNAPSHOT_PATH', os.path.join('snapshots', 'messages.arrow'))
+SNAPSHOT_CHUNK_SIZE = 50000
+
+# Upper bounds of the conversation length histogram on the Analytics page
+CONVERSATION_LENGTH_BINS = [0, 2, 4, 8, 16, 32, 64, 128, np.inf]
+
+def snapshot_supported() -> bool:
+    """Snapshots are Arrow files, which need the optional pyarrow."""
+    return importlib.util.find_spec('pyarrow') is not None
+
+@retry_on_locked
+def _fetch_chunk(after: tuple, chunk_size: int) -> list:
+    # Plain content is measured by SQLite; only compressed rows are read out and decoded
+    with connection() as conn:
+        return conn.execute('''
+            SELECT m.conversation_id, c.user_id, c.session_id, m.seq, m.role, m.timestamp,
+                   CASE WHEN m.content_format = 0 THEN LENGTH(m.content) END,
+                   CASE WHEN m.content_format != 0 THEN m.content END, m.content_format
+            FROM messages m JOIN conversations c ON c.id = m.conversation_id
+            WHERE (m.conversation_id, m.seq) > (?, ?)
+            ORDER BY m.conversation_id, m.seq
+            LIMIT ?
+        ''', (*after, chunk_size)).fetchall()
+
+def _live_chunks(chunk_size: int):
+    after = (-1, -1)
+    while True:
+        rows = _fetch_chunk(after, chunk_size)
+        if not rows:
+            return
+        # Plain rows already carry their length; compressed ones are decoded to measure it
+        yield [(*row[:6], row[6] if row[6] is not None else len(decode_content(row[7], row[8])))
+               for row in rows]
+        after = (rows[-1][0], rows[-1][3])
+
+def _archived_chunks(chunk_size: int):
+    for rows in iter_archived_rows(chunk_size=chunk_size):
+        yield [(*row[:6], len(row[6])) for row in rows]
+
+def build_snapshot(path: Optional[str] = None, chunk_size: int = SNAPSHOT_CHUNK_SIZE) -> int:
+    """
+    Flatten every stored message into a columnar Arrow snapshot and return the row count.
+
+    Only metadata and the content length are kept, one row per message,
+    including conversations moved to the retention archive, so the snapshot
+    covers the same history as the rollups. Rows are streamed in chunks, one
+    record batch each, and the file
+    replaces the previous snapshot atomically once it is complete. The file
+    is left uncompressed so it can be memory-mapped when loaded.
+    """
+    import pyarrow as pa
+
+    path = path or SNAPSHOT_PATH
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # Arrow files allow only one dictionary per column, so strings are stored as they are
+    schema = pa.schema([
+        ('conversation_id', pa.int64()), ('user_id', pa.string()), ('session_id', pa.string()),
+        ('seq', pa.int32()), ('role', pa.string()), ('timestamp', pa.timestamp('s')), ('length', pa.int32()),
+    ])
+
+    fd, tmp_path = tempfile.mkstemp(suffix='.arrow', dir=os.path.dirname(path) or '.')
+    os.close(fd)
+    rows_written = 0
+    try:
+        with pa.ipc.new_file(tmp_path, schema) as writer:
+            for rows in itertools.chain(_live_chunks(chunk_size), _archived_chunks(chunk_size)):
+                conv_ids, user_ids, session_ids, seqs, roles, timestamps, lengths = zip(*rows)
+                writer.write_table(pa.Table.from_pandas(pd.DataFrame({
+                    'conversation_id': conv_ids,
+                    'user_id': user_ids,
+                    'session_id': session_ids,
+                    'seq': np.array(seqs, dtype=np.int32),
+                    'role': roles,
+                    # Timestamps are free-form strings; anything unparseable becomes null
+                    'timestamp': pd.to_datetime(pd.Series(timestamps, dtype=object), errors='coerce',
+                                                format='%Y-%m-%d %H:%M:%S').astype('datetime64[s]'),
+                    'length': np.array(lengths, dtype=np.int32),
+                }), schema=schema, preserve_index=False))
+                rows_written += len(rows)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return rows_written
+
+def submit_snapshot() -> Future:
+    """Rebuild the snapshot in the export worker process; the future resolves to the row count."""
+    return get_export_executor().submit(build_snapshot)
+
+def snapshot_time(path: Optional[str] = None) -> Optional[datetime]:
+    """When the current snapshot was written, or None if there is none."""
+    path = path or SNAPSHOT_PATH
+    return datetime.fromtimestamp(os.path.getmtime(path)) if os.path.exists(path) else None
+
+@st.cache_resource(max_entries=1)
+def _load(path: str, mtime: float) -> pd.DataFrame:
+    import pyarrow as pa
+
+    # The columns stay Arrow-backed views of the memory-mapped file, so nothing
+    # is copied or decoded up front; pages are read in as the analysis touches them
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+def load_snapshot(path: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """
+    Return the snapshot as a DataFrame, or None if there is none.
+
+    It is read once per snapshot file and shared by every session until a
+    new snapshot replaces it.
+    """
+    path = path or SNAPSHOT_PATH
+    if not snapshot_supported() or not os.path.exists(path):
+        return None
+    return _load(path, os.path.getmtime(path))
+
+def length_by_role(df: pd.DataFrame) -> pd.DataFrame:
+    """Message count and length percentiles per role."""
+    grouped = df.groupby('role', observed=True)['length']
+    return pd.DataFrame({
+        'messages': grouped.size(),
+        'mean': grouped.mean(),
+        'p50': grouped.median(),
+        'p95': grouped.quantile(0.95),
+        'max': grouped.max(),
+    })
+
+def activity_by_hour(df: pd.DataFrame) -> pd.DataFrame:
+    """User messages per hour of the day, one column per weekday."""
+    user = df.loc[df['role'] == 'user', 'timestamp'].dropna()
+    table = pd.crosstab(user.dt.hour, user.dt.day_name())
+    weekdays = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    return table.reindex(index=range(24), columns=weekdays, fill_value=0)
+
+def conversation_lengths(df: pd.DataFrame) -> pd.Series:
+    """Number of conversations by how many messages they have."""
+    sizes = df.groupby('conversation_id').size()
+    bins = pd.cut(sizes, CONVERSATION_LENGTH_BINS, right=False)
+    counts = bins.value_counts(sort=False)
+    counts.index = [f"{int(b.left)}+" if np.isinf(b.right) else f"{int(b.left)}-{int(b.right) - 1}"
+                    for b in counts.index]
+    return counts
+
+def user_summary(df: pd.DataFrame, limit: int = 20) -> pd.DataFrame:
+    """Per-user totals of the users with the most turns."""
+    is_user = df['role'] == 'user'
+    per_user = pd.DataFrame({
+        'conversations': df.groupby('user_id', observed=True)['conversation_id'].nunique(),
+        'turns': is_user.groupby(df['user_id'], observed=True).sum(),
+        'avg_prompt_length': df['length'].where(is_user).groupby(df['user_id'], observed=True).mean(),
+        'avg_answer_length': df['length'].where(~is_user).groupby(df['user_id'], observed=True).mean(),
+        'last_message': df.groupby('user_id', observed=True)['timestamp'].max(),
+    })
+    return per_user.sort_values('turns', ascending=False).head(limit)
+
+if __name__ == "__main__":
+    print(f"Snapshot written to {SNAPSHOT_PATH}: {build_snapshot()} messages")
@@ -0,0 +1,237 @@
+import bisect
+import inspect
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Set METRICS_ENABLED=0 to turn every timer into a no-op
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+
+# Prometheus text file, e.g. for the node_exporter textfile collector
+METRICS_TEXTFILE = os.environ.get('METRICS_TEXTFILE')
+METRICS_WRITE_INTERVAL = float(os.environ.get('METRICS_WRITE_INTERVAL', '15'))
+
+# Serve /metrics over HTTP on this port, for Prometheus to scrape directly
+METRICS_PORT = os.environ.get('METRICS_PORT')
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+
+PREFIX = 'visit_sv'
+
+# Histogram bucket bounds in seconds, from sub-millisecond DB calls to slow LLM turns
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Latest samples kept per series, for the percentiles on the metrics page
+RECENT_SAMPLES = 1000
+
+HELP = {
+    'db_seconds': 'Latency of database calls',
+    'langflow_seconds': 'Latency of LangFlow calls, including retries',
+    'job_queue_wait_seconds': 'Time LangFlow turns waited for a worker',
+    'page_run_seconds': 'Duration of Streamlit page script runs',
+    'sqlite_lock_wait_seconds': 'Time spent waiting for the SQLite write lock',
+}
+
+class _Series:
+    __slots__ = ('buckets', 'count', 'sum', 'errors', 'recent')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+_series = {}
+_lock = threading.Lock()
+_export = {'last_write': 0.0, 'server': None}
+_export_lock = threading.Lock()
+
+def observe(metric: str, seconds: float, error: bool = False, **labels):
+    """Record one duration in the histogram for metric and labels."""
+    if not METRICS_ENABLED:
+        return
+    key = (metric, tuple(sorted(labels.items())))
+    index = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        series = _series.get(key)
+        if series is None:
+            series = _series[key] = _Series()
+        series.buckets[index] += 1
+        series.count += 1
+        series.sum += seconds
+        series.recent.append(seconds)
+        if error:
+            series.errors += 1
+
+@contextmanager
+def track(metric: str, **labels):
+    """Time the enclosed block; an exception escaping it is counted as an error."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        # st.rerun() and st.stop() raise BaseExceptions; those runs still count
+        observe(metric, time.perf_counter() - started, error, **labels)
+
+def timed(metric: str):
+    """Decorator timing every call of a function under metric, labelled with its name.
+
+    Generator functions are timed until the generator is exhausted or closed,
+    so a streamed response is measured end to end.
+    """
+    def decorator(func):
+        if inspect.isgeneratorfunction(func):
+            @wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                with track(metric, op=func.__name__):
+                    yield from func(*args, **kwargs)
+            return generator_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(metric, op=func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextmanager
+def page_run(page: str):
+    """Time one script run of a page and keep the Prometheus exports up to date."""
+    start_exporter()
+    try:
+        with track('page_run_seconds', page=page):
+            yield
+    finally:
+        _maybe_write_textfile()
+
+def _percentile(ordered: list, pct: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+def snapshot() -> list:
+    """Return every series with its totals and percentiles over the recent samples."""
+    with _lock:
+        items = [(key, series.count, series.sum, series.errors, list(series.recent))
+                 for key, series in _series.items()]
+    rows = []
+    for (metric, labels), count, total, errors, recent in sorted(items):
+        recent.sort()
+        rows.append({
+            'metric': metric,
+            'labels': dict(labels),
+            'count': count,
+            'errors': errors,
+            'mean': total / count if count else 0.0,
+            'p50': _percentile(recent, 50),
+            'p95': _percentile(recent, 95),
+            'p99': _percentile(recent, 99),
+            'max': recent[-1] if recent else 0.0,
+        })
+    return rows
+
+def reset():
+    """Forget everything recorded so far."""
+    with _lock:
+        _series.clear()
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def render_prometheus() -> str:
+    """Render every series in the Prometheus text exposition format."""
+    with _lock:
+        items = sorted((key, list(series.buckets), series.count, series.sum, series.errors)
+                       for key, series in _series.items())
+
+    lines = []
+    by_metric = {}
+    for (metric, labels), buckets, count, total, errors in items:
+        by_metric.setdefault(metric, []).append((labels, buckets, count, total, errors))
+
+    for metric, series in by_metric.items():
+        name = f"{PREFIX}_{metric}"
+        lines.append(f"# HELP {name} {HELP.get(metric, metric)}")
+        lines.append(f"# TYPE {name} histogram")
+        for labels, buckets, count, total, _ in series:
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS, buckets):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        errors_name = name.replace('_seconds', '') + '_errors_total'
+        lines.append(f"# HELP {errors_name} Observations of {name} that raised an exception")
+        lines.append(f"# TYPE {errors_name} counter")
+        for labels, _, _, _, errors in series:
+            lines.append(f"{errors_name}{_format_labels(labels)} {errors}")
+    return '\n'.join(lines) + '\n'
+
+def write_textfile(path: str):
+    """Write the metrics to path atomically, so a collector never reads half a file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+def _maybe_write_textfile():
+    if not METRICS_TEXTFILE:
+        return
+    now = time.monotonic()
+    with _export_lock:
+        if now - _export['last_write'] < METRICS_WRITE_INTERVAL:
+            return
+        _export['last_write'] = now
+    write_textfile(METRICS_TEXTFILE)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_exporter():
+    """Start the /metrics HTTP endpoint once per process, if METRICS_PORT is set."""
+    if not METRICS_PORT or not METRICS_ENABLED:
+        return
+    with _export_lock:
+        if _export['server'] is not None:
+            return
+        try:
+            server = ThreadingHTTPServer((METRICS_HOST, int(METRICS_PORT)), _MetricsHandler)
+        except OSError:
+            # Another process already serves the port; don't retry on every run
+            _export['server'] = False
+            return
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        _export['server'] = server
@@ -1,5 +1,6 @@
 import streamlit as st
-from PIL import Image
+from asset_pipeline import IMAGE_FORMAT, get_image
+from metrics import page_run
 
 st.set_page_config(
     page_title="Example Visit - Silicon Valley Visit Planner",
@@ -7,29 +8,33 @@ st.set_page_config(
     layout="wide"
 )
 
-# Check authentication
-if not st.session_state.get('authenticated', False):
-    st.warning("Please login to access this page.")
-    st.stop()
+# Each image fills half of the wide layout
+COLUMN_IMAGE_WIDTH = 960
 
-st.title("Example Silicon Valley Visit 🗺️")
+with page_run('Example Visit'):
+    # Check authentication
+    if not st.session_state.get('authenticated', False):
+        st.warning("Please login to access this page.")
+        st.stop()
 
-# Example Visit Timeline
-st.header("A Week in Silicon Valley")
+    st.title("Example Silicon Valley Visit 🗺️")
 
-# Pre-Visit Planning
-st.subheader("Pre-Visit Planning (2-3 months before)")
-col1, col2 = st.columns(2)
-with col1:
-    st.markdown("""
+    # Example Visit Timeline
+    st.header("A Week in Silicon Valley")
+
+    # Pre-Visit Planning
+    st.subheader("Pre-Visit Planning (2-3 months before)")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("""
     ### Research & Preparation
     - Research companies to visit
     - Connect with local contacts
     - Book accommodations
     - Plan transportation
     """)
-with col2:
-    st.markdown("""
+    with col2:
+        st.markdown("""
     ### Logistics
     - Apply for necessary visas
     - Book flights
@@ -37,27 +42,27 @@ with col2:
     - Set up mobile phone plan
     """)
 
-# During Visit
-st.subheader("During Your Visit (1 week)")
-col1, col2, col3 = st.columns(3)
-with col1:
-    st.markdown("""
+    # During Visit
+    st.subheader("During Your Visit (1 week)")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.markdown("""
     ### Day 1-2: Arrival & Orientation
     - Arrive at SFO
     - Check into accommodation
     - Visit Computer History Museum
     - Explore downtown Palo Alto
     """)
-with col2:
-    st.markdown("""
+    with col2:
+        st.markdown("""
     ### Day 3-4: Company Visits
     - Google Campus tour
     - Apple Park Visitor Center
     - Stanford University tour
     - Networking event
     """)
-with col3:
-    st.markdown("""
+    with col3:
+        st.markdown("""
     ### Day 5-7: Immersion
     - Y Combinator HQ visit
     - Meet with startup founders
@@ -65,19 +70,19 @@ with col3:
     - Cultural activities
     """)
 
-# Post-Visit
-st.subheader("Post-Visit Impact")
-col1, col2 = st.columns(2)
-with col1:
-    st.markdown("""
+    # Post-Visit
+    st.subheader("Post-Visit Impact")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("""
     ### Immediate Actions
     - Follow up with contacts
     - Document learnings
     - Share experiences
     - Plan next steps
     """)
-with col2:
-    st.markdown("""
+    with col2:
+        st.markdown("""
     ### Long-term Impact
     - Project development
     - Network building
@@ -85,9 +90,9 @@ with col2:
     - Community engagement
     """)
 
-# Tips and Recommendations
-st.header("Tips & Recommendations")
-st.markdown("""
+    # Tips and Recommendations
+    st.header("Tips & Recommendations")
+    st.markdown("""
 ### Best Practices
 1. **Networking**
    - Attend local meetups
@@ -110,12 +115,12 @@ st.markdown("""
    - Stay connected
 """)
 
-# Add some example images
-try:
-    col1, col2 = st.columns(2)
-    with col1:
-        st.image("assets/google_campus.jpg", caption="Google Campus", use_container_width=True)
-    with col2:
-        st.image("assets/apple_park.jpg", caption="Apple Park", use_container_width=True)
-except:
-    st.info("Images will be displayed here when available.") 
\ No newline at end of file
+    # Add some example images
+    try:
+        col1, col2 = st.columns(2)
+        with col1:
+            st.image(get_image("google_campus.jpg", COLUMN_IMAGE_WIDTH), caption="Google Campus", use_container_width=True, output_format=IMAGE_FORMAT)
+        with col2:
+            st.image(get_image("apple_park.jpg", COLUMN_IMAGE_WIDTH), caption="Apple Park", use_container_width=True, output_format=IMAGE_FORMAT)
+    except:
+        st.info("Images will be displayed here when available.") 
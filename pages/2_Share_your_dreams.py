@@ -1,79 +1,16 @@
 import streamlit as st
-import requests
-import json
 from dotenv import load_dotenv
 from datetime import datetime
 import os
-from database import init_db, save_conversation, get_conversation, get_user_sessions
-from typing import List, Optional
+from database import init_db, get_recent_messages, get_user_sessions
+from job_queue import QueueFullError, get_job_queue, submit_turn
+from message_rendering import render_messages, sanitize
+from metrics import page_run
+from response_cache import get_response_cache
+from retention import start_maintenance_scheduler
+from langflow_client import get_langflow_client
 import uuid
 
-# The rest of your existing functions...
-def run_flow(message: str, agent_name: str = "User_1", history: Optional[List[dict]] = None) -> dict:
-    """
-    Run the LangFlow with the given message and conversation history.
-    
-    Args:
-        message: The current user message
-        agent_name: The name of the user to use
-        history: Optional list of previous conversation messages
-    
-    Returns:
-        The response from LangFlow
-    """
-    api_url = f"{BASE_API_URL}/api/v1/run/{ENDPOINT}"
-    
-    # Include conversation history if available
-    if history and len(history) > 0:
-        # Format history in the way LangFlow expects it
-        formatted_history = json.dumps(history)
-        
-        payload = {
-            "input_value": message,
-            "output_type": "chat",
-            "input_type": "chat",
-            "conversation_history": formatted_history,
-            "user": agent_name,  # Pass the user name to LangFlow
-            "session_id": agent_name
-        }
-    else:
-        payload = {
-            "input_value": message,
-            "output_type": "chat",
-            "input_type": "chat",
-            "user": agent_name,  # Pass the user name to LangFlow
-            "session_id": agent_name
-        }
-
-    headers = {"Authorization": f"Bearer {APPLICATION_TOKEN}", "Content-Type": "application/json"}
-    
-    try:
-        response = requests.post(api_url, json=payload, headers=headers)
-        response_data = response.json()
-       
-        return response_data
-    except Exception as e:
-        raise e
-
-def add_to_history(role: str, content: str, user: Optional[str] = None):
-    """Add a message to the conversation history and save to database."""
-    message = {
-        "role": role,
-        "content": content,
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "user": user
-    }
-    
-    st.session_state.conversation_history.append(message)
-    
-    # Save updated conversation to database
-    username = st.session_state.get('username')
-    if not username:
-        st.error("User not authenticated")
-        return
-    session_id = st.session_state.get('session_id', str(uuid.uuid4()))
-    save_conversation(username, session_id, st.session_state.conversation_history)
-
 def display_conversation():
     """Display the conversation history in the Streamlit UI."""
     # Create scrollable container
@@ -93,15 +30,20 @@ def display_conversation():
             </style>
         """, unsafe_allow_html=True)
         
+        # Older messages stay in the database until they are asked for
+        if st.session_state.history_offset > 0:
+            if st.button(f"Load earlier messages ({st.session_state.history_offset} more)"):
+                st.session_state.display_window += DISPLAY_WINDOW
+                st.rerun()
+        
         chat_container = st.empty()
-        chat_content = ""
         
         # Build message content
-        for message in st.session_state.conversation_history:
-            if message["role"] == "user":
-                chat_content += f"<div style='color: orange'><b>You</b>: {message['content']}</div><br>"
-            else:
-                chat_content += f"<div><b>Assistant:</b> {message['content']}</div><br>"
+        chat_content = render_messages(
+            st.session_state.session_id,
+            st.session_state.conversation_history,
+            start_index=st.session_state.history_offset
+        )
         
         # Display all messages in the container
         chat_container.markdown(chat_content, unsafe_allow_html=True)
@@ -132,92 +74,133 @@ load_dotenv()
 
 # Initialize database
 init_db()
-
-# LangFlow connection settings
-BASE_API_URL = os.environ.get("BASE_API_URL")
-FLOW_ID = os.environ.get("FLOW_ID")
-APPLICATION_TOKEN = os.environ.get("APPLICATION_TOKEN")
-ENDPOINT = os.environ.get("ENDPOINT")  # The endpoint name of the flow
-
-# Initialize session state for conversation memory and user tracking
-if 'conversation_history' not in st.session_state:
-    st.session_state.conversation_history = []
-
-if 'session_id' not in st.session_state:
-    st.session_state.session_id = str(uuid.uuid4())
-
-# Load existing conversation from database
-username = st.session_state.get('username')
-if not username:
-    st.error("User not authenticated")
-    st.stop()
-st.session_state.conversation_history = get_conversation(username, st.session_state.session_id)
-
-st.set_page_config(
-    page_title="Interactive Chat - Silicon Valley Visit Planner",
-    page_icon="💬",
-    layout="wide"
-)
-
-# Check authentication
-if not st.session_state.get('authenticated', False):
-    st.warning("Please login to access this page.")
-    st.stop()
-
-st.title("Interactive Visit Planning Chat 💬")
-
-# Add session management UI
-if st.button("New Session"):
-    st.session_state.session_id = str(uuid.uuid4())
-    st.session_state.conversation_history = []
-    st.rerun()
-
-if st.session_state.get('username') == 'jazo':
-    st.subheader("Current Session")
-    st.write(f"Session ID: {st.session_state.session_id[:8]}...")
-
-    # Display user's previous sessions
-    st.subheader("Your Previous Sessions")
-    sessions = get_user_sessions(username)
-    if sessions:
-        for session in sessions:
-            st.write(f"Session: {session['session_id'][:8]}... (Last updated: {session['last_updated']})")
+start_maintenance_scheduler()
+
+# Render LangFlow answers token by token instead of waiting for the full response
+STREAM_RESPONSES = os.environ.get("STREAM_RESPONSES", "true").lower() in ("1", "true", "yes")
+# Number of most recent messages rendered, and added per "Load earlier" click
+DISPLAY_WINDOW = int(os.environ.get("CHAT_DISPLAY_WINDOW", "20"))
+# Seconds between checks on a turn being answered in the background
+TURN_POLL_INTERVAL = float(os.environ.get("CHAT_POLL_INTERVAL", "0.5"))
+
+@st.fragment(run_every=TURN_POLL_INTERVAL)
+def display_pending_turn():
+    """Poll the worker answering the latest message, showing the answer as it arrives."""
+    job = get_job_queue().get(st.session_state.get('pending_turn'))
+    if job is None or job.done:
+        st.session_state.pop('pending_turn', None)
+        if job is not None and job.status == 'failed':
+            st.session_state.turn_error = job.error
+        # Reload the conversation, which now includes the stored answer
+        st.rerun()
+
+    # The message is stored together with its answer, so until then it only lives here
+    history = st.session_state.conversation_history
+    st.markdown(render_messages(st.session_state.session_id, [st.session_state.pending_message],
+                                start_index=st.session_state.history_offset + len(history)),
+                unsafe_allow_html=True)
+
+    if job.status == 'queued':
+        st.info("Waiting for a free assistant...")
+    elif job.partial:
+        st.markdown(f"<div><b>Assistant:</b> {sanitize(job.partial)}</div>", unsafe_allow_html=True)
     else:
-        st.write("No previous sessions found.")
+        st.info("The assistant is thinking...")
 
-# User input
-message = st.text_area("Message", placeholder="Ask something...")
 
-if st.button("Send"):
-    if not message.strip():
-        st.error("Please enter a message")
-    
-    # Add user message to history
-    add_to_history("user", message)
-    
-    try:
-        with st.spinner(f"Running flow with ..."):
-            # Pass the conversation history to LangFlow with the selected user
-            response = run_flow(
-                message,
-                history=st.session_state.conversation_history[:-1]  # Exclude the current message
-            )
-            
-            # Extract the response text
-            response_text = response["outputs"][0]["outputs"][0]["results"]["message"]["text"]
-            
-            # Add bot response to history with user info
-            add_to_history("assistant", response_text)
-            
-            # Save conversation to database with session ID
-            save_conversation(username, st.session_state.session_id, st.session_state.conversation_history)
-            
-            # Force a rerun to update the display
-            st.rerun()
-            
-    except Exception as e:
-        st.error(f"Error: {str(e)}")
-        st.error("Response: " + str(response) if 'response' in locals() else "No response received")
-
-# Display conversation history
-display_conversation()
+with page_run('Share your dreams'):
+    # Initialize session state for conversation memory and user tracking
+    if 'conversation_history' not in st.session_state:
+        st.session_state.conversation_history = []
+
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = str(uuid.uuid4())
+
+    if 'display_window' not in st.session_state:
+        st.session_state.display_window = DISPLAY_WINDOW
+
+    # Load the displayed window of the existing conversation from database
+    username = st.session_state.get('username')
+    if not username:
+        st.error("User not authenticated")
+        st.stop()
+    st.session_state.conversation_history, st.session_state.history_offset = get_recent_messages(
+        username, st.session_state.session_id, st.session_state.display_window
+    )
+
+    st.set_page_config(
+        page_title="Interactive Chat - Silicon Valley Visit Planner",
+        page_icon="💬",
+        layout="wide"
+    )
+
+    # Check authentication
+    if not st.session_state.get('authenticated', False):
+        st.warning("Please login to access this page.")
+        st.stop()
+
+    st.title("Interactive Visit Planning Chat 💬")
+
+    # Add session management UI
+    if st.button("New Session"):
+        st.session_state.session_id = str(uuid.uuid4())
+        st.session_state.conversation_history = []
+        st.session_state.display_window = DISPLAY_WINDOW
+        # An answer still on its way belongs to the old session
+        st.session_state.pop('pending_turn', None)
+        st.rerun()
+
+    if st.session_state.get('username') == 'jazo':
+        st.subheader("Current Session")
+        st.write(f"Session ID: {st.session_state.session_id[:8]}...")
+
+        # Display user's previous sessions
+        st.subheader("Your Previous Sessions")
+        sessions = get_user_sessions(username)
+        if sessions:
+            for session in sessions:
+                st.write(f"Session: {session['session_id'][:8]}... (Last updated: {session['last_updated']})")
+        else:
+            st.write("No previous sessions found.")
+
+        # Connection health and latency of the shared LangFlow client
+        st.subheader("LangFlow Client")
+        st.json(get_langflow_client().stats())
+        st.subheader("LangFlow Queue")
+        st.json(get_job_queue().stats())
+        if get_response_cache():
+            st.subheader("Response Cache")
+            st.json(get_response_cache().stats())
+
+    # User input
+    message = st.text_area("Message", placeholder="Ask something...")
+
+    # One turn at a time per session, so answers stay in order
+    answering = 'pending_turn' in st.session_state
+    if st.button("Send", disabled=answering):
+        if not message.strip():
+            st.error("Please enter a message")
+        else:
+            user_message = {
+                "role": "user",
+                "content": message,
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "user": None
+            }
+            try:
+                # A background worker calls LangFlow and stores the message with its
+                # answer, so this script run is not held for the LLM's latency
+                job = submit_turn(username, st.session_state.session_id, user_message, stream=STREAM_RESPONSES)
+                st.session_state.pending_turn = job.id
+                st.session_state.pending_message = user_message
+                answering = True
+            except QueueFullError as e:
+                st.error(str(e))
+
+    if 'turn_error' in st.session_state:
+        st.error(f"Error: {st.session_state.pop('turn_error')}")
+
+    # Display conversation history
+    display_conversation()
+    if answering:
+        display_pending_turn()
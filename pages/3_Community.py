@@ -1,6 +1,7 @@
 import streamlit as st
-import json
 from datetime import datetime
+from community_store import add_post, get_category_counts, get_posts_page
+from metrics import page_run
 
 st.set_page_config(
     page_title="Community - Silicon Valley Visit Planner",
@@ -8,69 +9,68 @@ st.set_page_config(
     layout="wide"
 )
 
-# Check authentication
-if not st.session_state.get('authenticated', False):
-    st.warning("Please login to access this page.")
-    st.stop()
+with page_run('Community'):
+    # Check authentication
+    if not st.session_state.get('authenticated', False):
+        st.warning("Please login to access this page.")
+        st.stop()
 
-st.title("Silicon Valley Visit Community 👥")
+    st.title("Silicon Valley Visit Community 👥")
 
-# Initialize community data
-if 'community_posts' not in st.session_state:
-    st.session_state.community_posts = []
+    # Post counts per category, maintained by every new post
+    category_counts = get_category_counts()
 
-def load_community_posts():
-    try:
-        with open('community_posts.json', 'r') as f:
-            return json.load(f)
-    except:
-        return []
-
-def save_community_posts(posts):
-    with open('community_posts.json', 'w') as f:
-        json.dump(posts, f)
+    # Create new post
+    with st.expander("Create New Post"):
+        st.subheader("Share Your Experience")
+        post_title = st.text_input("Title")
+        post_content = st.text_area("Content")
+        post_category = st.selectbox(
+            "Category",
+            ["Pre-Visit Planning", "During Visit", "Post-Visit Impact", "General Discussion"]
+        )
+    
+        if st.button("Post"):
+            if post_title and post_content:
+                new_post = {
+                    "title": post_title,
+                    "content": post_content,
+                    "category": post_category,
+                    "author": st.session_state.username,
+                    "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                }
+                add_post(new_post)
+                # Start the feed over so the new post shows at the top
+                st.session_state.pop('feed_query', None)
+                st.success("Post created successfully!")
+                st.rerun()
+            else:
+                st.error("Please fill in both title and content.")
 
-# Load existing posts
-st.session_state.community_posts = load_community_posts()
+    # Display posts
+    st.header("Community Posts")
 
-# Create new post
-with st.expander("Create New Post"):
-    st.subheader("Share Your Experience")
-    post_title = st.text_input("Title")
-    post_content = st.text_area("Content")
-    post_category = st.selectbox(
-        "Category",
-        ["Pre-Visit Planning", "During Visit", "Post-Visit Impact", "General Discussion"]
+    # Filter posts by category
+    category_filter = st.selectbox(
+        "Filter by Category",
+        ["All"] + list(category_counts)
     )
-    
-    if st.button("Post"):
-        if post_title and post_content:
-            new_post = {
-                "title": post_title,
-                "content": post_content,
-                "category": post_category,
-                "author": st.session_state.username,
-                "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            st.session_state.community_posts.append(new_post)
-            save_community_posts(st.session_state.community_posts)
-            st.success("Post created successfully!")
-            st.rerun()
-        else:
-            st.error("Please fill in both title and content.")
 
-# Display posts
-st.header("Community Posts")
+    # Cursors of the pages visited so far; the first page is read fresh on
+    # every run, so new posts show up, and the feed starts over whenever
+    # the filter changes
+    if st.session_state.get('feed_query') != category_filter:
+        st.session_state.feed_query = category_filter
+        st.session_state.feed_cursors = [None]
+    feed_cursors = st.session_state.feed_cursors
 
-# Filter posts by category
-category_filter = st.selectbox(
-    "Filter by Category",
-    ["All"] + list(set(post["category"] for post in st.session_state.community_posts))
-)
+    posts, next_cursor = get_posts_page(
+        before_id=feed_cursors[-1],
+        category=None if category_filter == "All" else category_filter
+    )
 
-# Display filtered posts
-for post in reversed(st.session_state.community_posts):
-    if category_filter == "All" or post["category"] == category_filter:
+    # Display one page of posts, newest first
+    for post in posts:
         with st.container():
             st.markdown(f"### {post['title']}")
             st.markdown(f"**Category:** {post['category']}")
@@ -78,26 +78,33 @@ for post in reversed(st.session_state.community_posts):
             st.markdown(post['content'])
             st.markdown("---")
 
-# Community statistics
-st.sidebar.header("Community Statistics")
-total_posts = len(st.session_state.community_posts)
-st.sidebar.metric("Total Posts", total_posts)
+    # Page navigation
+    prev_col, page_col, next_col = st.columns([1, 4, 1])
+    with prev_col:
+        if st.button("← Newer posts", disabled=len(feed_cursors) == 1):
+            feed_cursors.pop()
+            st.rerun()
+    with page_col:
+        st.caption(f"Page {len(feed_cursors)}")
+    with next_col:
+        if st.button("Load more →", disabled=next_cursor is None):
+            feed_cursors.append(next_cursor)
+            st.rerun()
 
-# Categories breakdown
-categories = {}
-for post in st.session_state.community_posts:
-    categories[post['category']] = categories.get(post['category'], 0) + 1
+    # Community statistics
+    st.sidebar.header("Community Statistics")
+    st.sidebar.metric("Total Posts", sum(category_counts.values()))
 
-st.sidebar.subheader("Posts by Category")
-for category, count in categories.items():
-    st.sidebar.metric(category, count)
+    st.sidebar.subheader("Posts by Category")
+    for category, count in category_counts.items():
+        st.sidebar.metric(category, count)
 
-# Community guidelines
-st.sidebar.header("Community Guidelines")
-st.sidebar.markdown("""
+    # Community guidelines
+    st.sidebar.header("Community Guidelines")
+    st.sidebar.markdown("""
 1. Be respectful and professional
 2. Share authentic experiences
 3. Provide helpful information
 4. Follow posting categories
 5. Report inappropriate content
-""") 
\ No newline at end of file
+""") 
@@ -1,35 +1,13 @@
+import html
 import streamlit as st
-import sqlite3
-import json
 from datetime import datetime
-import pandas as pd
-import io
-
-def get_all_conversations():
-    """Retrieve all conversations from the database."""
-    conn = sqlite3.connect('conversations.db')
-    c = conn.cursor()
-    
-    # Get all conversations for admin view
-    c.execute('SELECT id, user_id, conversation_data, last_updated FROM conversations')
-    results = c.fetchall()
-    
-    conn.close()
-    
-    conversations = []
-    for id, user_id, conversation_data, last_updated in results:
-        try:
-            messages = json.loads(conversation_data)
-            conversations.append({
-                'id': id,
-                'user_id': user_id,
-                'messages': messages,
-                'last_updated': last_updated
-            })
-        except json.JSONDecodeError:
-            continue
-    
-    return conversations
+import os
+from database import (init_db, list_conversations, list_archived_conversations, get_conversation_users,
+                      get_conversation_by_id, search_messages)
+from message_rendering import render_messages
+from metrics import page_run
+from retention import start_maintenance_scheduler
+from exports import available_formats, conversation_csv, remove_export, submit_export
 
 st.set_page_config(
     page_title="Admin Dashboard - Conversation History",
@@ -37,141 +15,275 @@ st.set_page_config(
     layout="wide"
 )
 
-# Check if user is authenticated and is admin
-if not st.session_state.get('authenticated', False):
-    st.warning("Please login to access this page.")
-    st.stop()
+with page_run('Admin Dashboard'):
+    # Check if user is authenticated and is admin
+    if not st.session_state.get('authenticated', False):
+        st.warning("Please login to access this page.")
+        st.stop()
+
+    if st.session_state.get('user_role') != 'admin':
+        st.error("Access denied. This page is only available for administrators.")
+        st.stop()
 
-if st.session_state.get('user_role') != 'admin':
-    st.error("Access denied. This page is only available for administrators.")
-    st.stop()
+    st.title("Admin Dashboard - Conversation History 🔍")
 
-st.title("Admin Dashboard - Conversation History 🔍")
+    init_db()
+    start_maintenance_scheduler()
 
-# Get all conversations
-conversations = get_all_conversations()
+    PAGE_SIZE = 25
 
-if not conversations:
-    st.info("No conversations found in the database.")
-else:
-    # Initialize session state for active tab if not exists
-    if 'active_tab' not in st.session_state:
-        st.session_state.active_tab = "Conversation List"
+    users = get_conversation_users()
+    # Conversations moved out by retention are only listed in the Archived tab
+    has_archived = bool(list_archived_conversations(page_size=1)[0])
+
+    if not users and not has_archived:
+        st.info("No conversations found in the database.")
+    else:
+        # Initialize session state for active tab if not exists
+        if 'active_tab' not in st.session_state:
+            st.session_state.active_tab = "Conversation List"
     
-    # Create tabs for different views
-    tab1, tab2 = st.tabs(["Conversation List", "Detailed View"])
+        # Create tabs for different views
+        tab1, tab2, tab3, tab4 = st.tabs(["Conversation List", "Detailed View", "Search", "Archived"])
     
-    with tab1:
-        # Create a summary table
-        summary_data = []
-        for conv in conversations:
-            user_id = conv['user_id']
-            message_count = len(conv['messages'])
-            last_updated = conv['last_updated']
-            
-            # Get the last message
-            last_message = conv['messages'][-1]['content'] if conv['messages'] else "No messages"
-            last_message = last_message[:100] + "..." if len(last_message) > 100 else last_message
-            
-            summary_data.append({
-                'ID': conv['id'],
-                'User ID': user_id,
-                'Message Count': message_count,
-                'Last Updated': last_updated,
-                'Last Message': last_message
-            })
+        with tab1:
+            # Sort and filter controls
+            filter_col, sort_col = st.columns(2)
+            with filter_col:
+                user_filter = st.selectbox("Filter by user", ["All users"] + users, key='list_user_filter')
+            with sort_col:
+                sort_order = st.selectbox("Sort by", ["Newest first", "Oldest first"], key='list_sort_order')
         
-        df = pd.DataFrame(summary_data)
+            # Cursors of the pages visited so far; reset whenever the query changes
+            query = (user_filter, sort_order)
+            if st.session_state.get('list_query') != query:
+                st.session_state.list_query = query
+                st.session_state.list_cursors = [None]
+            cursors = st.session_state.list_cursors
         
-        # Display the dataframe with clickable links
-        for idx, row in df.iterrows():
-            col1, col2, col3, col4, col5, col6, col7 = st.columns([1, 2, 1, 2, 3, 1, 1])
-            with col1:
-                st.write(row['ID'])
-            with col2:
-                st.write(row['User ID'])
-            with col3:
-                st.write(row['Message Count'])
-            with col4:
-                st.write(row['Last Updated'])
-            with col5:
-                st.write(row['Last Message'])
-            with col6:
-                if st.button('View', key=f'view_{idx}'):
-                    st.session_state.selected_conversation = conversations[idx]
-                    st.session_state.selected_conversation_id = row['ID']
-                    st.switch_page("pages/6_View_Conversation.py")
-            with col7:
-                # Create DataFrame for the conversation
-                messages_data = []
-                for msg in conversations[idx]['messages']:
-                    messages_data.append({
-                        'Timestamp': msg.get('timestamp', 'No timestamp'),
-                        'Role': msg['role'],
-                        'Content': msg['content']
-                    })
-                conv_df = pd.DataFrame(messages_data)
-                
-                # Create CSV in memory
-                csv_buffer = io.StringIO()
-                conv_df.to_csv(csv_buffer, index=False)
-                csv_str = csv_buffer.getvalue()
-                
-                # Create download button
-                st.download_button(
-                    label="📥",
-                    data=csv_str,
-                    file_name=f"conversation_{row['User ID']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv",
-                    help="Download conversation as CSV",
-                    key=f'download_{idx}'
-                )
+            page, next_cursor = list_conversations(
+                page_size=PAGE_SIZE,
+                cursor=cursors[-1],
+                user_id=None if user_filter == "All users" else user_filter,
+                newest_first=sort_order == "Newest first"
+            )
+        
+            # Display the page with clickable links
+            for row in page:
+                col1, col2, col3, col4, col5, col6, col7 = st.columns([1, 2, 1, 2, 3, 1, 1])
+                with col1:
+                    st.write(row['id'])
+                with col2:
+                    st.write(row['user_id'])
+                with col3:
+                    st.write(row['message_count'])
+                with col4:
+                    st.write(row['last_updated'])
+                with col5:
+                    st.write(row['last_message_preview'])
+                with col6:
+                    if st.button('View', key=f"view_{row['id']}"):
+                        st.session_state.selected_conversation = get_conversation_by_id(row['id'])
+                        st.session_state.selected_conversation_id = row['id']
+                        st.switch_page("pages/6_View_Conversation.py")
+                with col7:
+                    # Only build the CSV once it has been asked for; the key changes
+                    # with the message count, so a CSV never outlives new messages
+                    csv_key = f"csv_{row['id']}_{row['message_count']}"
+                    if csv_key in st.session_state:
+                        st.download_button(
+                            label="💾",
+                            data=st.session_state[csv_key],
+                            file_name=f"conversation_{row['user_id']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                            mime="text/csv",
+                            help="Save conversation CSV",
+                            key=f"download_{row['id']}"
+                        )
+                    elif st.button("📥", key=f"export_{row['id']}", help="Download conversation as CSV"):
+                        # Only the latest CSV is kept in the session
+                        for key in [key for key in st.session_state if key.startswith('csv_')]:
+                            del st.session_state[key]
+                        st.session_state[csv_key] = conversation_csv(row['id'])
+                        st.rerun()
+        
+            # Page navigation
+            prev_col, page_col, next_col = st.columns([1, 4, 1])
+            with prev_col:
+                if st.button("← Previous", disabled=len(cursors) == 1):
+                    cursors.pop()
+                    st.rerun()
+            with page_col:
+                st.caption(f"Page {len(cursors)}")
+            with next_col:
+                if st.button("Next →", disabled=next_cursor is None):
+                    cursors.append(next_cursor)
+                    st.rerun()
     
-    with tab2:
-        # Allow selecting a specific conversation to view
-        selected_user = st.selectbox(
-            "Select a user to view their conversation:",
-            options=[conv['user_id'] for conv in conversations],
-            key='selected_user',
-            index=([conv['user_id'] for conv in conversations].index(st.session_state.get('selected_user', conversations[0]['user_id'])))
-        )
+            # Bulk export of every conversation, or the filtered user's
+            with st.expander("Export conversations"):
+                export_format = st.selectbox("Format", available_formats(), key='export_format')
+                export_scope = "all conversations" if user_filter == "All users" else f"conversations of {user_filter}"
+            
+                export_job = st.session_state.get('export_job')
+                if export_job is None:
+                    if st.button(f"Export {export_scope}"):
+                        st.session_state.export_job = submit_export(
+                            export_format,
+                            None if user_filter == "All users" else user_filter
+                        )
+                        st.rerun()
+                elif not export_job.done():
+                    st.info("Export running in the background...")
+                    if st.button("Check again"):
+                        st.rerun()
+                elif export_job.exception():
+                    st.error(f"Export failed: {export_job.exception()}")
+                    if st.button("Dismiss"):
+                        del st.session_state.export_job
+                        st.rerun()
+                else:
+                    export_path = export_job.result()
+                    # The button reads the whole zip into server memory for this
+                    # session on every rerun, so the export is deleted once dismissed
+                    with open(export_path, 'rb') as f:
+                        st.download_button(
+                            label="📥 Download export",
+                            data=f,
+                            file_name=os.path.basename(export_path),
+                            mime="application/zip"
+                        )
+                    if st.button("New export"):
+                        remove_export(export_path)
+                        del st.session_state.export_job
+                        st.rerun()
+    
+        with tab2:
+            # Allow selecting a specific conversation to view
+            selected_user = st.selectbox(
+                "Select a user to view their conversation:",
+                options=users,
+                key='selected_user',
+                index=users.index(st.session_state['selected_user']) if st.session_state.get('selected_user') in users else 0
+            )
         
-        # Display the selected conversation
-        selected_conv = next((conv for conv in conversations if conv['user_id'] == selected_user), None)
+            # Display the selected user's most recent conversation
+            latest, _ = list_conversations(page_size=1, user_id=selected_user)
+            selected_conv = get_conversation_by_id(latest[0]['id']) if latest else None
         
-        if selected_conv:
-            st.markdown(f"""
+            if selected_conv:
+                st.markdown(f"""
                 <div style='background-color: #2b2b2b; padding: 15px; border-radius: 10px; margin-bottom: 20px;'>
-                    <h2 style='color: white; margin: 0;'>Conversation with {selected_user}</h2>
+                    <h2 style='color: white; margin: 0;'>Conversation with {html.escape(selected_user)}</h2>
                     <p style='color: #cccccc; margin: 5px 0 0 0;'>Last updated: {selected_conv['last_updated']}</p>
                 </div>
             """, unsafe_allow_html=True)
             
-            # Create a container with grey background for the conversation
-            st.markdown("""
+                # Create a container with grey background for the conversation
+                st.markdown("""
                 <div style='background-color: #f0f2f6; padding: 20px; border-radius: 10px; margin: 10px 0;'>
             """, unsafe_allow_html=True)
             
-            # Create a chat-like display
-            for message in selected_conv['messages']:
-                role = message['role']
-                content = message['content']
-                timestamp = message.get('timestamp', 'No timestamp')
-                
-                if role == 'user':
-                    st.markdown(f"""
-                        <div style='background-color: #e0e0e0; padding: 10px; border-radius: 5px; margin: 5px 0; color: #000000;'>
-                            <b>User</b> ({timestamp}):<br>
-                            {content}
-                        </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    st.markdown(f"""
-                        <div style='background-color: #e0e0e0; padding: 10px; border-radius: 5px; margin: 5px 0; color: #000000;'>
-                            <b>Assistant</b> ({timestamp}):<br>
-                            {content}
+                # Create a chat-like display
+                st.markdown(
+                    render_messages(selected_conv['id'], selected_conv['messages'], style='admin'),
+                    unsafe_allow_html=True
+                )
+            
+                # Close the container
+                st.markdown("</div>", unsafe_allow_html=True) 
+    
+        with tab3:
+            # Full-text search across every stored message
+            search_query = st.text_input("Search messages", placeholder="e.g. computer history museum")
+        
+            filter_col1, filter_col2, filter_col3 = st.columns(3)
+            with filter_col1:
+                search_user = st.selectbox("User", ["All users"] + users, key='search_user')
+            with filter_col2:
+                search_role = st.selectbox("Role", ["Any role", "user", "assistant"], key='search_role')
+            with filter_col3:
+                search_dates = st.date_input("Date range", value=(), key='search_dates')
+        
+            if search_query.strip():
+                results = search_messages(
+                    search_query,
+                    user_id=None if search_user == "All users" else search_user,
+                    role=None if search_role == "Any role" else search_role,
+                    date_from=search_dates[0].isoformat() if len(search_dates) > 0 else None,
+                    date_to=search_dates[1].isoformat() if len(search_dates) > 1 else None
+                )
+            
+                if not results:
+                    st.info("No matching messages.")
+                for result in results:
+                    col1, col2 = st.columns([6, 1])
+                    with col1:
+                        st.markdown(f"""
+                        <div style='padding: 5px 0;'>
+                            <b>{html.escape(result['user_id'])}</b> · {html.escape(result['role'])} · {html.escape(result['timestamp'] or 'No timestamp')}<br>
+                            {result['snippet']}
                         </div>
                     """, unsafe_allow_html=True)
-            
-            # Close the container
-            st.markdown("</div>", unsafe_allow_html=True) 
\ No newline at end of file
+                    with col2:
+                        if st.button('Open', key=f"open_{result['conversation_id']}_{result['seq']}"):
+                            st.session_state.selected_conversation = get_conversation_by_id(result['conversation_id'])
+                            st.session_state.selected_conversation_id = result['conversation_id']
+                            st.switch_page("pages/6_View_Conversation.py")
+
+        with tab4:
+            st.caption("Conversations idle long enough to be moved out of the database by retention. "
+                       "They are read-only and not included in the list or search.")
+
+            # Open any conversation, live or archived, by its ID
+            lookup_col, open_col = st.columns([3, 1])
+            with lookup_col:
+                lookup_id = st.number_input("Conversation ID", min_value=1, step=1, value=None, key='archived_lookup')
+            with open_col:
+                st.write("")
+                if st.button("Open", key='archived_lookup_open', disabled=lookup_id is None):
+                    conversation = get_conversation_by_id(int(lookup_id))
+                    if conversation:
+                        st.session_state.selected_conversation = conversation
+                        st.session_state.selected_conversation_id = int(lookup_id)
+                        st.switch_page("pages/6_View_Conversation.py")
+                    st.error(f"No conversation with ID {int(lookup_id)}.")
+
+            archived_user = st.text_input("Filter by user", key='archived_user_filter').strip()
+            # Cursors of the pages visited so far; reset whenever the filter changes
+            if st.session_state.get('archived_query') != archived_user:
+                st.session_state.archived_query = archived_user
+                st.session_state.archived_cursors = [None]
+            archived_cursors = st.session_state.archived_cursors
+
+            archived, next_archived = list_archived_conversations(
+                page_size=PAGE_SIZE, before_id=archived_cursors[-1], user_id=archived_user or None
+            )
+            if not archived:
+                st.info("No archived conversations.")
+            for row in archived:
+                col1, col2, col3, col4, col5 = st.columns([1, 2, 1, 2, 1])
+                with col1:
+                    st.write(row['id'])
+                with col2:
+                    st.write(row['user_id'])
+                with col3:
+                    st.write(row['message_count'])
+                with col4:
+                    st.write(row['last_updated'])
+                with col5:
+                    if st.button('View', key=f"view_archived_{row['id']}"):
+                        st.session_state.selected_conversation = get_conversation_by_id(row['id'])
+                        st.session_state.selected_conversation_id = row['id']
+                        st.switch_page("pages/6_View_Conversation.py")
+
+            prev_col, page_col, next_col = st.columns([1, 4, 1])
+            with prev_col:
+                if st.button("← Previous", key='archived_prev', disabled=len(archived_cursors) == 1):
+                    archived_cursors.pop()
+                    st.rerun()
+            with page_col:
+                st.caption(f"Page {len(archived_cursors)}")
+            with next_col:
+                if st.button("Next →", key='archived_next', disabled=next_archived is None):
+                    archived_cursors.append(next_archived)
+                    st.rerun()
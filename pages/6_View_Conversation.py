@@ -1,58 +1,38 @@
+import html
 import streamlit as st
-import sqlite3
-import json
+import os
 from datetime import datetime
-import pandas as pd
-import io
-
-def get_conversation_by_id(conv_id):
-    """Retrieve a conversation by its ID from the database."""
-    conn = sqlite3.connect('conversations.db')
-    c = conn.cursor()
-    
-    # Get conversation by ID
-    c.execute('SELECT user_id, conversation_data, last_updated FROM conversations WHERE id = ?', (conv_id,))
-    result = c.fetchone()
-    
-    conn.close()
-    
-    if result:
-        user_id, conversation_data, last_updated = result
-        try:
-            messages = json.loads(conversation_data)
-            return {
-                'id': conv_id,
-                'user_id': user_id,
-                'messages': messages,
-                'last_updated': last_updated
-            }
-        except json.JSONDecodeError:
-            return None
-    return None
-
-def get_conversation(user_id):
-    """Retrieve a specific conversation from the database."""
-    conn = sqlite3.connect('conversations.db')
-    c = conn.cursor()
-    
-    # Admin can view any conversation
-    c.execute('SELECT conversation_data, last_updated FROM conversations WHERE user_id = ?', (user_id,))
-    result = c.fetchone()
-    
-    conn.close()
-    
-    if result:
-        conversation_data, last_updated = result
-        try:
-            messages = json.loads(conversation_data)
-            return {
-                'user_id': user_id,
-                'messages': messages,
-                'last_updated': last_updated
-            }
-        except json.JSONDecodeError:
-            return None
-    return None
+from database import init_db, get_messages, get_conversation_status
+from exports import conversation_csv
+from message_rendering import render_messages
+from metrics import page_run
+from retention import start_maintenance_scheduler
+
+# Seconds between checks for new messages while live tail is on
+LIVE_TAIL_INTERVAL = float(os.environ.get('VIEW_TAIL_INTERVAL', '2'))
+
+def fetch_new_messages(conv_id, conversation) -> int:
+    """Append messages stored since the conversation was loaded; returns how many arrived."""
+    status = get_conversation_status(conv_id)
+    messages = conversation['messages']
+    if not status or status[0] <= len(messages):
+        return 0
+    new_messages = get_messages(conv_id, start_seq=len(messages))
+    messages.extend(new_messages)
+    conversation['last_updated'] = status[1]
+    return len(new_messages)
+
+@st.fragment(run_every=LIVE_TAIL_INTERVAL)
+def live_tail(conv_id, conversation):
+    """Poll for new messages and render only those that arrived since the page was drawn."""
+    fetch_new_messages(conv_id, conversation)
+    tail_from = st.session_state.tail_from
+    if len(conversation['messages']) > tail_from:
+        st.markdown(
+            render_messages(conv_id, conversation['messages'][tail_from:], start_index=tail_from, style='admin'),
+            unsafe_allow_html=True
+        )
+    st.caption(f"Watching for new messages... last updated {conversation['last_updated']}")
 
 def render_page():
     # Check if user is authenticated and is admin
@@ -64,6 +44,9 @@ def render_page():
         st.error("Access denied. This page is only available for administrators.")
         return
 
+    init_db()
+    start_maintenance_scheduler()
+
     # Get the selected conversation from session state
     selected_conv = st.session_state.get('selected_conversation')
     if not selected_conv:
@@ -76,46 +59,45 @@ def render_page():
     # Display conversation information in a more organized way
     st.markdown(f"""
         <div style='background-color: #2b2b2b; padding: 15px; border-radius: 10px; margin-bottom: 20px;'>
-            <h2>Conversation ID: {conv_id} with {selected_conv['user_id']} 💬</h2>
+            <h2>Conversation ID: {conv_id} with {html.escape(selected_conv['user_id'])} 💬</h2>
             <p>Last updated: {selected_conv['last_updated']}</p>
         </div>
     """, unsafe_allow_html=True)
 
+    # Archived conversations never change, so there is nothing to refresh or tail
+    archived = selected_conv.get('archived', False)
+    if archived:
+        st.info("This conversation has been archived and is read-only.")
+
     # Add refresh and download buttons in a row
-    col1, col2 = st.columns([1, 6])
+    col1, col2, col3 = st.columns([1, 1, 5])
     with col1:
         # Get the current conversation ID from session state
         current_conv_id = st.session_state.get('selected_conversation_id')
-        if st.button(f"🔄 Refresh Conversation ID: {current_conv_id}"):
-            # Reload the conversation data from database using the conversation ID
-            refreshed_conv = get_conversation_by_id(current_conv_id)
-            if refreshed_conv:
-                st.session_state.selected_conversation = refreshed_conv
+        if st.button(f"🔄 Refresh Conversation ID: {current_conv_id}", disabled=archived):
+            # Only messages stored since the last load are read
+            if fetch_new_messages(current_conv_id, selected_conv):
                 st.rerun()
     with col2:
-        # Create DataFrame for the conversation
-        messages_data = []
-        for msg in selected_conv['messages']:
-            messages_data.append({
-                'Timestamp': msg.get('timestamp', 'No timestamp'),
-                'Role': msg['role'],
-                'Content': msg['content']
-            })
-        conv_df = pd.DataFrame(messages_data)
-        
-        # Create CSV in memory
-        csv_buffer = io.StringIO()
-        conv_df.to_csv(csv_buffer, index=False)
-        csv_str = csv_buffer.getvalue()
-        
-        # Create download button
-        st.download_button(
-            label="📥 Download Conversation",
-            data=csv_str,
-            file_name=f"conversation_{selected_conv['user_id']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv",
-            help="Download conversation as CSV"
-        )
+        live = st.toggle("Live tail", key='live_tail', help="Show new messages as they arrive", disabled=archived)
+    with col3:
+        # Only build the CSV once it has been asked for; the key changes with
+        # the message count, so a refresh or live tail makes it build again
+        csv_key = f"csv_{current_conv_id}_{len(selected_conv['messages'])}"
+        if csv_key in st.session_state:
+            st.download_button(
+                label="💾 Save Conversation CSV",
+                data=st.session_state[csv_key],
+                file_name=f"conversation_{selected_conv['user_id']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                mime="text/csv",
+                help="Download conversation as CSV"
+            )
+        elif st.button("📥 Download Conversation", help="Download conversation as CSV"):
+            # Only the latest CSV is kept in the session
+            for key in [key for key in st.session_state if key.startswith('csv_')]:
+                del st.session_state[key]
+            st.session_state[csv_key] = conversation_csv(current_conv_id)
+            st.rerun()
 
     # Create a container with grey background for the conversation
     st.markdown("""
@@ -123,29 +105,19 @@ def render_page():
     """, unsafe_allow_html=True)
 
     # Create a chat-like display
-    for message in selected_conv['messages']:
-        role = message['role']
-        content = message['content']
-        timestamp = message.get('timestamp', 'No timestamp')
-        
-        if role == 'user':
-            st.markdown(f"""
-                <div style='background-color: #e0e0e0; padding: 10px; border-radius: 5px; margin: 5px 0; color: #000000;'>
-                    <b>User</b> ({timestamp}):<br>
-                    {content}
-                </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.markdown(f"""
-                <div style='background-color: #e0e0e0; padding: 10px; border-radius: 5px; margin: 5px 0; color: #000000;'>
-                    <b>Assistant</b> ({timestamp}):<br>
-                    {content}
-                </div>
-            """, unsafe_allow_html=True)
+    st.markdown(
+        render_messages(conv_id, selected_conv['messages'], style='admin'),
+        unsafe_allow_html=True
+    )
 
     # Close the container
     st.markdown("</div>", unsafe_allow_html=True)
 
+    # Messages after these are appended by the live tail without redrawing the rest
+    st.session_state.tail_from = len(selected_conv['messages'])
+    if live and not archived:
+        live_tail(conv_id, selected_conv)
+
     # Add a back button
     if st.button("Back to Admin Dashboard"):
         st.switch_page("pages/5_Admin_Dashboard.py")
@@ -156,4 +128,5 @@ if __name__ == "__main__":
         page_icon="💬",
         layout="wide"
     )
-    render_page() 
\ No newline at end of file
+    with page_run('View Conversation'):
+        render_page() 
\ No newline at end of file
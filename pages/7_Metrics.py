@@ -0,0 +1,85 @@
+import streamlit as st
+import pandas as pd
+from database import init_db
+from db_connection import lock_stats
+from job_queue import get_job_queue
+from metrics import page_run, render_prometheus, reset, snapshot
+from retention import maintenance_history, start_maintenance_scheduler
+
+st.set_page_config(
+    page_title="Metrics - Silicon Valley Visit Planner",
+    page_icon="📈",
+    layout="wide"
+)
+
+with page_run('Metrics'):
+    # Check if user is authenticated and is admin
+    if not st.session_state.get('authenticated', False):
+        st.warning("Please login to access this page.")
+        st.stop()
+
+    if st.session_state.get('user_role') != 'admin':
+        st.error("Access denied. This page is only available for administrators.")
+        st.stop()
+
+    init_db()
+    start_maintenance_scheduler()
+
+    st.title("Metrics 📈")
+    st.caption("Counts since this server process started; percentiles cover the most recent calls of each series.")
+
+    rows = snapshot()
+    if not rows:
+        st.info("Nothing has been measured yet.")
+    else:
+        metric_names = sorted({row['metric'] for row in rows})
+        selected = st.selectbox("Metric", ["All metrics"] + metric_names)
+        table = pd.DataFrame([{
+            'Metric': row['metric'],
+            'Name': ', '.join(str(value) for value in row['labels'].values()),
+            'Calls': row['count'],
+            'Errors': row['errors'],
+            'Mean (ms)': row['mean'] * 1000,
+            'p50 (ms)': row['p50'] * 1000,
+            'p95 (ms)': row['p95'] * 1000,
+            'p99 (ms)': row['p99'] * 1000,
+            'Max (ms)': row['max'] * 1000,
+        } for row in rows if selected in ("All metrics", row['metric'])])
+        st.dataframe(table.sort_values('p95 (ms)', ascending=False), hide_index=True,
+                     use_container_width=True, column_config={
+                         column: st.column_config.NumberColumn(format="%.1f")
+                         for column in ('Mean (ms)', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'Max (ms)')
+                     })
+
+    st.subheader("SQLite write lock")
+    stats = lock_stats()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Write transactions", stats['waits'])
+    col2.metric("Avg lock wait (ms)", f"{stats['wait_seconds'] / stats['waits'] * 1000:.2f}" if stats['waits'] else "0")
+    col3.metric("Lock retries", stats['retries'])
+
+    st.subheader("LangFlow queue")
+    queue_stats = get_job_queue().stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Waiting", queue_stats['queued'])
+    col2.metric("In flight", f"{queue_stats['running']} / {queue_stats['workers']}")
+    col3.metric("Failed", queue_stats['failed'])
+    col4.metric("Turned away", queue_stats['rejected'])
+
+    st.subheader("Retention maintenance")
+    runs = maintenance_history()
+    if runs:
+        st.dataframe(pd.DataFrame(runs).rename(columns={
+            'ran_at': 'Ran at', 'archived': 'Conversations archived', 'pages_freed': 'Pages freed'
+        }), hide_index=True)
+    else:
+        st.info("Maintenance has not run yet.")
+
+    with st.expander("Prometheus format"):
+        text = render_prometheus()
+        st.download_button("Download", text, file_name="metrics.prom", mime="text/plain")
+        st.code(text, language=None)
+
+    if st.button("Reset metrics"):
+        reset()
+        st.rerun()
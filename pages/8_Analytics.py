@@ -0,0 +1,136 @@
+import streamlit as st
+import pandas as pd
+from database import init_db, get_daily_activity, get_activity_totals, get_top_users
+from message_snapshot import (activity_by_hour, conversation_lengths, length_by_role, load_snapshot,
+                              snapshot_supported, snapshot_time, submit_snapshot, user_summary)
+from metrics import page_run
+from retention import start_maintenance_scheduler
+
+st.set_page_config(
+    page_title="Analytics - Silicon Valley Visit Planner",
+    page_icon="📊",
+    layout="wide"
+)
+
+PERIODS = {"Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90, "Last year": 365}
+
+with page_run('Analytics'):
+    # Check if user is authenticated and is admin
+    if not st.session_state.get('authenticated', False):
+        st.warning("Please login to access this page.")
+        st.stop()
+
+    if st.session_state.get('user_role') != 'admin':
+        st.error("Access denied. This page is only available for administrators.")
+        st.stop()
+
+    init_db()
+    start_maintenance_scheduler()
+
+    st.title("Analytics 📊")
+    st.caption("Read from daily rollups that are updated with every saved message, so this page "
+               "costs the same however long the history is.")
+
+    days = PERIODS[st.selectbox("Period", list(PERIODS), index=1)]
+    totals = get_activity_totals(days)
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Messages", totals['messages'])
+    col2.metric("Active users", totals['active_users'])
+    col3.metric("Turns per conversation",
+                f"{totals['turns_per_conversation']:.1f}" if totals['turns_per_conversation'] is not None else "-")
+    col4.metric("Avg LangFlow latency (s)",
+                f"{totals['langflow_mean_seconds']:.2f}" if totals['langflow_mean_seconds'] is not None else "-")
+
+    activity = get_daily_activity(days)
+    if not activity:
+        st.info("No activity in this period.")
+        st.stop()
+
+    # Days without activity have no rollup row; show them as zero
+    all_days = pd.date_range(end=pd.Timestamp.now().normalize(), periods=days).strftime('%Y-%m-%d')
+    daily = pd.DataFrame(activity).set_index('day').reindex(all_days)
+    counts = ['messages', 'user_messages', 'conversations_started', 'active_users',
+              'langflow_calls', 'langflow_errors']
+    daily[counts] = daily[counts].fillna(0).astype(int)
+
+    st.subheader("Messages per day")
+    st.bar_chart(daily[['user_messages']].assign(assistant_messages=daily['messages'] - daily['user_messages'])
+                 .rename(columns={'user_messages': 'User', 'assistant_messages': 'Assistant'}))
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Active users per day")
+        st.line_chart(daily[['active_users']].rename(columns={'active_users': 'Active users'}))
+    with col2:
+        st.subheader("Conversations started per day")
+        st.line_chart(daily[['conversations_started']].rename(columns={'conversations_started': 'Conversations'}))
+
+    st.subheader("LangFlow latency")
+    if totals['langflow_calls']:
+        st.line_chart(daily[['langflow_mean_seconds', 'langflow_max_seconds']]
+                      .rename(columns={'langflow_mean_seconds': 'Mean (s)', 'langflow_max_seconds': 'Max (s)'}))
+        st.caption(f"{totals['langflow_calls']} calls, {totals['langflow_errors']} failed. "
+                   "Cached answers are not counted.")
+    else:
+        st.info("No LangFlow calls in this period.")
+
+    st.subheader("Most active users")
+    top_users = get_top_users()
+    st.dataframe(pd.DataFrame(top_users).rename(columns={
+        'user_id': 'User',
+        'messages': 'Messages',
+        'user_messages': 'Turns',
+        'conversations': 'Conversations',
+        'first_active': 'First active',
+        'last_active': 'Last active'
+    }), hide_index=True, use_container_width=True)
+
+    st.subheader("Message-level analysis")
+    if not snapshot_supported():
+        st.info("Install pyarrow to enable message-level analysis.")
+        st.stop()
+
+    # Snapshot rebuilds run in the export worker process
+    snapshot_job = st.session_state.get('snapshot_job')
+    taken = snapshot_time()
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        st.caption(f"From the snapshot taken {taken:%Y-%m-%d %H:%M}, refreshed by each maintenance run."
+                   if taken else "No snapshot has been taken yet.")
+    with col2:
+        if snapshot_job is not None and not snapshot_job.done():
+            if st.button("Check again"):
+                st.rerun()
+        elif st.button("Refresh snapshot"):
+            st.session_state.snapshot_job = submit_snapshot()
+            st.rerun()
+    if snapshot_job is not None and snapshot_job.done():
+        if snapshot_job.exception():
+            st.error(f"Snapshot failed: {snapshot_job.exception()}")
+        del st.session_state.snapshot_job
+
+    messages = load_snapshot()
+    if messages is None or messages.empty:
+        st.stop()
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**Message length (characters)**")
+        st.dataframe(length_by_role(messages).round(1), use_container_width=True)
+    with col2:
+        st.markdown("**Conversations by number of messages**")
+        st.bar_chart(conversation_lengths(messages).rename('Conversations'))
+
+    st.markdown("**User messages by hour of day**")
+    st.bar_chart(activity_by_hour(messages))
+
+    st.markdown("**Users with the most turns**")
+    top_users = user_summary(messages).round({'avg_prompt_length': 1, 'avg_answer_length': 1})
+    st.dataframe(top_users.rename(columns={
+        'conversations': 'Conversations',
+        'turns': 'Turns',
+        'avg_prompt_length': 'Avg prompt length',
+        'avg_answer_length': 'Avg answer length',
+        'last_message': 'Last message'
+    }), use_container_width=True)
@@ -0,0 +1,79 @@
+import argparse
+import time
+from database import init_db, codec_tag, decode_content, encode_content
+from db_connection import connection, transaction, retry_on_locked
+
+def _stored_size(value) -> int:
+    return len(value) if isinstance(value, bytes) else len(value.encode('utf-8'))
+
+@retry_on_locked
+def fetch_batch(after: tuple, batch_size: int) -> list:
+    with connection() as conn:
+        return conn.execute('''
+            SELECT conversation_id, seq, content, content_format FROM messages
+            WHERE (conversation_id, seq) > (?, ?)
+            ORDER BY conversation_id, seq
+            LIMIT ?
+        ''', (*after, batch_size)).fetchall()
+
+@retry_on_locked
+def apply_batch(updates: list):
+    with transaction() as conn:
+        conn.executemany('''
+            UPDATE messages SET content = ?, content_format = ?
+            WHERE conversation_id = ? AND seq = ?
+        ''', updates)
+
+def reencode_messages(codec: str = None, batch_size: int = 500, dry_run: bool = False, pause: float = 0.0):
+    """
+    Re-encode stored message content with the given codec (MESSAGE_CODEC by default).
+
+    Runs online: messages are read in key order, batch_size at a time, and
+    each batch is written in its own short transaction. Rows already in the
+    target format are left alone, so an interrupted run can simply be
+    started again.
+    """
+    init_db()
+    target = codec_tag(codec)
+    after = (-1, -1)
+    scanned = changed = bytes_before = bytes_after = 0
+    started = time.perf_counter()
+    while True:
+        batch = fetch_batch(after, batch_size)
+        if not batch:
+            break
+
+        updates = []
+        for conv_id, seq, value, fmt in batch:
+            size = _stored_size(value)
+            bytes_before += size
+            if fmt == target:
+                bytes_after += size
+                continue
+            new_value, new_fmt = encode_content(decode_content(value, fmt), codec)
+            bytes_after += _stored_size(new_value)
+            if new_fmt != fmt:
+                updates.append((new_value, new_fmt, conv_id, seq))
+
+        if updates and not dry_run:
+            apply_batch(updates)
+
+        scanned += len(batch)
+        changed += len(updates)
+        after = (batch[-1][0], batch[-1][1])
+        elapsed = time.perf_counter() - started
+        print(f"Processed {scanned} messages ({scanned / elapsed:.0f} rows/s)")
+        if pause:
+            time.sleep(pause)
+
+    print(f"Re-encode completed! {changed} of {scanned} messages {'would be ' if dry_run else ''}re-encoded, "
+          f"content {bytes_before / 1024:.0f} KB -> {bytes_after / 1024:.0f} KB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=reencode_messages.__doc__.strip().splitlines()[0])
+    parser.add_argument('--codec', choices=['plain', 'zlib', 'zstd'], help="target codec (default: MESSAGE_CODEC)")
+    parser.add_argument('--batch-size', type=int, default=500, help="messages per transaction")
+    parser.add_argument('--dry-run', action='store_true', help="report savings without writing")
+    parser.add_argument('--pause', type=float, default=0.0, help="seconds to sleep between batches")
+    args = parser.parse_args()
+    reencode_messages(args.codec, args.batch_size, args.dry_run, args.pause)
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import streamlit as st
+from db_connection import connection, transaction, retry_on_locked
+
+# The cache is opt-in: identical prompts only get identical answers when enabled
+RESPONSE_CACHE_ENABLED = os.environ.get('LANGFLOW_RESPONSE_CACHE', 'false').lower() in ('1', 'true', 'yes')
+RESPONSE_CACHE_PERSIST = os.environ.get('LANGFLOW_RESPONSE_CACHE_PERSIST', 'false').lower() in ('1', 'true', 'yes')
+RESPONSE_CACHE_SIZE = int(os.environ.get('LANGFLOW_RESPONSE_CACHE_SIZE', '512'))
+RESPONSE_CACHE_TTL = float(os.environ.get('LANGFLOW_RESPONSE_CACHE_TTL', '3600'))
+
+# How many writes between sweeps of expired and excess rows in the SQLite tier
+_PRUNE_EVERY = 100
+
+def normalize_prompt(text: str) -> str:
+    """Normalize a prompt so trivially different phrasings share a cache entry."""
+    text = ' '.join(text.lower().split())
+    return re.sub(r'[\s?!.]+$', '', text)
+
+def make_cache_key(message: str, endpoint: str, history: Optional[List[dict]] = None) -> str:
+    """Key a response on the normalized prompt, the flow endpoint and the history sent."""
+    history_hash = hashlib.sha256(
+        json.dumps(history or [], sort_keys=True).encode('utf-8')
+    ).hexdigest()
+    raw = json.dumps([normalize_prompt(message), endpoint, history_hash])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """
+    LRU cache of LangFlow response texts with a TTL and a size cap.
+
+    Entries live in process memory. With persistent=True they are also
+    written to a response_cache table, so they survive restarts and are
+    shared by every process using the same database.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600, persistent: bool = False):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persistent = persistent
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        self._writes = 0
+        if persistent:
+            self._init_table()
+
+    @retry_on_locked
+    def _init_table(self):
+        with transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_response_cache_created ON response_cache(created_at)')
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for a key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                response, created_at = entry
+                if now - created_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return response
+                del self._entries[key]
+
+        if self.persistent:
+            row = self._load(key, now - self.ttl)
+            if row is not None:
+                with self._lock:
+                    self._stats['hits'] += 1
+                    self._stats['disk_hits'] += 1
+                self._remember(key, row[0], row[1])
+                return row[0]
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def put(self, key: str, response: str):
+        """Cache a response under a key."""
+        now = time.time()
+        self._remember(key, response, now)
+        if self.persistent:
+            self._store(key, response, now)
+
+    def _remember(self, key: str, response: str, created_at: float):
+        with self._lock:
+            self._entries[key] = (response, created_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    @retry_on_locked
+    def _load(self, key: str, oldest: float):
+        with connection() as conn:
+            return conn.execute(
+                'SELECT response, created_at FROM response_cache WHERE key = ? AND created_at >= ?',
+                (key, oldest)
+            ).fetchone()
+
+    @retry_on_locked
+    def _store(self, key: str, response: str, created_at: float):
+        with transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO response_cache (key, response, created_at) VALUES (?, ?, ?)',
+                (key, response, created_at)
+            )
+            self._writes += 1
+            if self._writes % _PRUNE_EVERY == 0:
+                conn.execute('DELETE FROM response_cache WHERE created_at < ?', (created_at - self.ttl,))
+                # The persistent tier keeps ten times as many entries as memory
+                conn.execute('''
+                    DELETE FROM response_cache WHERE key IN (
+                        SELECT key FROM response_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                    )
+                ''', (self.max_entries * 10,))
+
+    def stats(self) -> dict:
+        """Return hit, miss and eviction counters and the current size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+@st.cache_resource
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the process-wide response cache, or None when caching is disabled."""
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    return ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_PERSIST)
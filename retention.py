@@ -0,0 +1,245 @@
+import argparse
+import logging
+import os
+import threading
+import time
+
+import streamlit as st
+from archive_segments import append_records
+from database import init_db, get_messages
+from db_connection import connection, transaction, retry_on_locked
+from message_snapshot import build_snapshot, snapshot_supported
+
+logger = logging.getLogger(__name__)
+
+# Conversations idle for longer than this move to the archive
+RETENTION_DAYS = float(os.environ.get('CONVERSATION_RETENTION_DAYS', '90'))
+
+# Conversations archived per segment append and delete transaction
+ARCHIVE_BATCH_SIZE = 200
+
+# Free pages returned to the filesystem per incremental vacuum step
+VACUUM_STEP_PAGES = 1000
+
+# How often the in-app scheduler runs maintenance; 0 leaves it to cron
+MAINTENANCE_INTERVAL_HOURS = float(os.environ.get('MAINTENANCE_INTERVAL_HOURS', '24'))
+
+# How often the scheduler checks whether maintenance is due
+_SCHEDULER_CHECK_SECONDS = 600
+
+@retry_on_locked
+def fetch_idle_batch(days: float, batch_size: int) -> list:
+    """Get the longest-idle conversations not updated for more than days."""
+    with connection() as conn:
+        return conn.execute('''
+            SELECT id, user_id, session_id, last_updated, message_count, summary, summary_upto
+            FROM conversations
+            WHERE last_updated < datetime('now', ?)
+            ORDER BY last_updated, id
+            LIMIT ?
+        ''', (f'-{days} days', batch_size)).fetchall()
+
+@retry_on_locked
+def count_idle(days: float) -> int:
+    with connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM conversations WHERE last_updated < datetime('now', ?)",
+                            (f'-{days} days',)).fetchone()[0]
+
+@retry_on_locked
+def remove_archived(archived: list) -> int:
+    """
+    Index archived conversations and delete them from the live tables.
+
+    A conversation that received a message after it was read is kept; its
+    archive record is simply never referenced.
+    """
+    removed = []
+    with transaction() as conn:
+        c = conn.cursor()
+        for (conv_id, user_id, session_id, last_updated, message_count), (segment, offset, length) in archived:
+            current = c.execute('SELECT last_updated, message_count FROM conversations WHERE id = ?',
+                                (conv_id,)).fetchone()
+            if current != (last_updated, message_count):
+                continue
+            c.execute('''
+                INSERT OR REPLACE INTO archived_conversations
+                (id, user_id, session_id, last_updated, message_count, segment, offset, length)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (conv_id, user_id, session_id, last_updated, message_count, segment, offset, length))
+            removed.append(conv_id)
+
+        if removed:
+            placeholders = ','.join('?' * len(removed))
+            c.execute(f'DELETE FROM messages WHERE conversation_id IN ({placeholders})', removed)
+            c.execute(f'DELETE FROM messages_fts WHERE conversation_id IN ({placeholders})', removed)
+            c.execute(f'DELETE FROM conversations WHERE id IN ({placeholders})', removed)
+    return len(removed)
+
+def archive_idle_conversations(days: float = RETENTION_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE,
+                               dry_run: bool = False) -> int:
+    """
+    Move conversations idle for longer than days into compressed archive segments.
+
+    Returns how many were archived, or with dry_run how many would be.
+
+    Each batch is appended to the current segment and fsynced before it is
+    deleted from the live database, so a crash can at worst leave a record
+    that is archived again on the next run.
+    """
+    if dry_run:
+        return count_idle(days)
+
+    archived = 0
+    while True:
+        batch = fetch_idle_batch(days, batch_size)
+        if not batch:
+            break
+
+        records = [{
+            'id': conv_id,
+            'user_id': user_id,
+            'session_id': session_id,
+            'last_updated': last_updated,
+            'summary': summary,
+            'summary_upto': summary_upto,
+            'messages': get_messages(conv_id),
+        } for conv_id, user_id, session_id, last_updated, message_count, summary, summary_upto in batch]
+        locations = append_records(records)
+        removed = remove_archived([(row[:5], location) for row, location in zip(batch, locations)])
+        archived += removed
+        logger.info("Archived %d conversations", archived)
+        if removed == 0:
+            # Everything left in this batch was written to in the meantime
+            break
+    return archived
+
+@retry_on_locked
+def enable_incremental_vacuum() -> bool:
+    """
+    Switch the database to incremental auto-vacuum, returning whether it had to be changed.
+
+    The switch needs one full VACUUM, which rewrites the whole file and
+    blocks every writer while it runs. It is therefore only done from the
+    command line, never by the in-app scheduler. New databases are
+    incremental from the start (db_connection).
+    """
+    with connection() as conn:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+            return False
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+        return True
+
+@retry_on_locked
+def incremental_vacuum(max_pages: int = None) -> int:
+    """
+    Return free pages to the filesystem in short steps; returns how many were freed.
+
+    Does nothing until the database uses incremental auto-vacuum.
+    """
+    freed = 0
+    with connection() as conn:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            return 0
+        while max_pages is None or freed < max_pages:
+            free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if not free:
+                break
+            step = min(free, VACUUM_STEP_PAGES if max_pages is None else max_pages - freed)
+            # execute() stops after the first page; executescript() runs the pragma to completion
+            conn.executescript(f'PRAGMA incremental_vacuum({step})')
+            left = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if left >= free:
+                break
+            freed += free - left
+    return freed
+
+@retry_on_locked
+def analyze():
+    """Refresh query planner statistics where they have gone stale."""
+    with connection() as conn:
+        # Bound the work per index, so this stays cheap on a large database
+        conn.execute('PRAGMA analysis_limit = 1000')
+        conn.execute('PRAGMA optimize')
+
+@retry_on_locked
+def _log_run(archived: int, pages_freed: int):
+    with transaction() as conn:
+        conn.execute('INSERT INTO maintenance_log (archived, pages_freed) VALUES (?, ?)', (archived, pages_freed))
+
+def run_maintenance(days: float = RETENTION_DAYS, vacuum: bool = True) -> dict:
+    """Archive idle conversations, reclaim their space, refresh statistics and the analysis snapshot."""
+    init_db()
+    started = time.perf_counter()
+    archived = archive_idle_conversations(days)
+    pages_freed = 0
+    if vacuum:
+        pages_freed = incremental_vacuum()
+    analyze()
+    if snapshot_supported():
+        build_snapshot()
+    _log_run(archived, pages_freed)
+    return {'archived': archived, 'pages_freed': pages_freed, 'seconds': time.perf_counter() - started}
+
+@retry_on_locked
+def maintenance_history(limit: int = 10) -> list:
+    """Return the most recent maintenance runs, newest first."""
+    with connection() as conn:
+        rows = conn.execute(
+            'SELECT ran_at, archived, pages_freed FROM maintenance_log ORDER BY ran_at DESC LIMIT ?', (limit,)
+        ).fetchall()
+    return [{'ran_at': ran_at, 'archived': archived, 'pages_freed': pages_freed}
+            for ran_at, archived, pages_freed in rows]
+
+@retry_on_locked
+def _maintenance_due() -> bool:
+    with connection() as conn:
+        return conn.execute(
+            "SELECT COALESCE(MAX(ran_at) < datetime('now', ?), 1) FROM maintenance_log",
+            (f'-{MAINTENANCE_INTERVAL_HOURS} hours',)
+        ).fetchone()[0] == 1
+
+def _scheduler_loop():
+    while True:
+        try:
+            # The scheduler may be started before any page has opened the database
+            init_db()
+            if _maintenance_due():
+                logger.info("Retention maintenance finished: %s", run_maintenance())
+        except Exception:
+            logger.exception("Retention maintenance failed")
+        time.sleep(_SCHEDULER_CHECK_SECONDS)
+
+@st.cache_resource
+def start_maintenance_scheduler() -> bool:
+    """
+    Run maintenance in the background whenever the last run is older than the interval.
+
+    Every page that opens the conversations database calls this, as does
+    Home.py, so maintenance resumes after a restart whichever page is
+    opened first.
+    """
+    if MAINTENANCE_INTERVAL_HOURS <= 0:
+        return False
+    # The last run is read from the database, so restarts don't trigger extra runs
+    threading.Thread(target=_scheduler_loop, name='retention-maintenance', daemon=True).start()
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=run_maintenance.__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=float, default=RETENTION_DAYS, help="archive conversations idle this long")
+    parser.add_argument('--dry-run', action='store_true', help="report what would be archived and stop")
+    parser.add_argument('--no-vacuum', action='store_true',
+                        help="skip the vacuum, including the one-off switch to incremental auto-vacuum")
+    args = parser.parse_args()
+    # Show the per-batch progress on the console
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if args.dry_run:
+        init_db()
+        print(f"Would archive {archive_idle_conversations(args.days, dry_run=True)} conversations")
+    else:
+        if not args.no_vacuum and enable_incremental_vacuum():
+            print("Switched the database to incremental auto-vacuum")
+        result = run_maintenance(args.days, not args.no_vacuum)
+        print(f"Maintenance completed! {result['archived']} conversations archived, "
+              f"{result['pages_freed']} pages freed in {result['seconds']:.1f}s")
@@ -1,34 +1,164 @@
-import sqlite3
+import argparse
 import json
+import os
+import time
+from archive_segments import read_record
+from database import init_db, activity_days, move_activity
+from db_connection import connection, transaction, retry_on_locked
 from datetime import datetime
 
-def update_conversations():
-    """Update the user_id in existing conversations to match the authenticated user."""
-    conn = sqlite3.connect('conversations.db')
-    c = conn.cursor()
-    
-    # Get all conversations
-    c.execute('SELECT id, user_id, conversation_data, last_updated FROM conversations')
-    results = c.fetchall()
-    
-    for conv_id, old_user_id, conversation_data, last_updated in results:
-        try:
-            messages = json.loads(conversation_data)
+CHECKPOINT_PATH = 'update_conversations.checkpoint.json'
+
+def _fresh_checkpoint() -> dict:
+    return {'last_id': 0, 'last_archived_id': 0, 'scanned': 0, 'updated': 0}
+
+def load_checkpoint(path: str) -> dict:
+    """Return saved progress, or a fresh start if there is none."""
+    try:
+        with open(path, 'r') as f:
+            return dict(_fresh_checkpoint(), **json.load(f))
+    except (OSError, json.JSONDecodeError):
+        return _fresh_checkpoint()
+
+def save_checkpoint(path: str, checkpoint: dict):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+@retry_on_locked
+def fetch_batch(last_id: int, batch_size: int) -> list:
+    """
+    Get the next batch of conversations with the sender named in their first user message.
+
+    That is the message's 'username' key, which the blob migration keeps in
+    messages.user.
+    """
+    with connection() as conn:
+        return conn.execute('''
+            SELECT c.id, c.user_id, m.user
+            FROM conversations c
+            JOIN messages m ON m.conversation_id = c.id AND m.seq = (
+                SELECT MIN(seq) FROM messages WHERE conversation_id = c.id AND role = 'user'
+            )
+            WHERE c.id > ?
+            ORDER BY c.id
+            LIMIT ?
+        ''', (last_id, batch_size)).fetchall()
+
+@retry_on_locked
+def fetch_archived_batch(last_id: int, batch_size: int) -> list:
+    """Get the next batch of archived conversations with the sender named in their first user message."""
+    with connection() as conn:
+        rows = conn.execute('''
+            SELECT id, user_id, last_updated, segment, offset, length
+            FROM archived_conversations
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+        ''', (last_id, batch_size)).fetchall()
+
+    batch = []
+    for conv_id, user_id, last_updated, *location in rows:
+        messages = read_record(*location)['messages']
+        first_user = next((message.get('user') or message.get('username')
+                           for message in messages if message['role'] == 'user'), None)
+        # Archived messages are no longer in SQLite, so the rollup days come from the record
+        batch.append((conv_id, user_id, first_user, activity_days(messages, (last_updated or '')[:10] or None)))
+    return batch
+
+@retry_on_locked
+def apply_batch(updates: list):
+    """Reassign live conversations and move their messages to the new user's rollups."""
+    with transaction() as conn:
+        c = conn.cursor()
+        for username, conv_id, old_user_id in updates:
+            c.execute('UPDATE conversations SET user_id = ? WHERE id = ?', (username, conv_id))
+            # Messages without a timestamp are counted as the rollup backfill counts them
+            messages = [{'timestamp': timestamp, 'role': role} for timestamp, role in c.execute('''
+                SELECT COALESCE(m.timestamp, c.last_updated), m.role
+                FROM messages m JOIN conversations c ON c.id = m.conversation_id
+                WHERE m.conversation_id = ?
+            ''', (conv_id,)).fetchall()]
+            if messages:
+                move_activity(c, old_user_id, username, *activity_days(messages))
+
+@retry_on_locked
+def apply_archived_batch(updates: list):
+    """Reassign archived conversations and move their messages to the new user's rollups."""
+    with transaction() as conn:
+        c = conn.cursor()
+        for username, conv_id, old_user_id, (days, user_days) in updates:
+            c.execute('UPDATE archived_conversations SET user_id = ? WHERE id = ?', (username, conv_id))
+            if days:
+                move_activity(c, old_user_id, username, days, user_days)
+
+def update_conversations(batch_size: int = 500, dry_run: bool = False, resume: bool = True,
+                         checkpoint_path: str = CHECKPOINT_PATH, pause: float = 0.0):
+    """
+    Update the user_id in existing conversations to match the authenticated user.
+
+    Live conversations are processed in id order, then archived ones,
+    batch_size at a time. Each batch is one short transaction that also
+    moves the conversations' messages in the activity rollups, so live chat
+    writes are never held up for long and per-user analytics follow the new
+    user_id. Progress is checkpointed after every batch, so an interrupted
+    run picks up where it stopped.
+    """
+    init_db()
+    checkpoint = load_checkpoint(checkpoint_path) if resume else _fresh_checkpoint()
+    if checkpoint['last_id'] or checkpoint['last_archived_id']:
+        print(f"Resuming after conversation {checkpoint['last_id']}, "
+              f"archived conversation {checkpoint['last_archived_id']}")
+
+    started = time.perf_counter()
+    scanned = 0
+    for cursor, fetch, apply in (('last_id', fetch_batch, apply_batch),
+                                 ('last_archived_id', fetch_archived_batch, apply_archived_batch)):
+        while True:
+            batch = fetch(checkpoint[cursor], batch_size)
+            if not batch:
+                break
+
             # Get the username from the first user message
-            for message in messages:
-                if message['role'] == 'user':
-                    username = message.get('username', old_user_id)
-                    # Update the user_id in the database
-                    c.execute('UPDATE conversations SET user_id = ? WHERE id = ?', (username, conv_id))
-                    print(f"Updated conversation {conv_id} from {old_user_id} to {username}")
-                    break
-        except json.JSONDecodeError:
-            print(f"Error processing conversation {conv_id}")
-            continue
-    
-    conn.commit()
-    conn.close()
-    print("Update completed!")
+            updates = []
+            for conv_id, old_user_id, first_user, *rest in batch:
+                username = first_user or old_user_id
+                if username != old_user_id:
+                    updates.append((username, conv_id, old_user_id, *rest))
+                    print(f"{'Would update' if dry_run else 'Updated'} "
+                          f"{'archived ' if cursor == 'last_archived_id' else ''}conversation {conv_id} "
+                          f"from {old_user_id} to {username}")
+
+            if updates and not dry_run:
+                apply(updates)
+
+            scanned += len(batch)
+            checkpoint[cursor] = batch[-1][0]
+            checkpoint['scanned'] += len(batch)
+            checkpoint['updated'] += len(updates)
+            if not dry_run:
+                save_checkpoint(checkpoint_path, checkpoint)
+
+            elapsed = time.perf_counter() - started
+            print(f"Processed {checkpoint['scanned']} conversations ({scanned / elapsed:.0f} rows/s)")
+            if pause:
+                time.sleep(pause)
+
+    elapsed = time.perf_counter() - started
+    rate = scanned / elapsed if elapsed else 0
+    print(f"Update completed! {checkpoint['updated']} of {checkpoint['scanned']} conversations "
+          f"{'would be ' if dry_run else ''}updated, {rate:.0f} rows/s")
+    if not dry_run and os.path.exists(checkpoint_path):
+        # The run finished, so the next one should start from the beginning
+        os.remove(checkpoint_path)
 
 if __name__ == "__main__":
-    update_conversations() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=update_conversations.__doc__.strip().splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=500, help="conversations per transaction")
+    parser.add_argument('--dry-run', action='store_true', help="report changes without writing them")
+    parser.add_argument('--restart', action='store_true', help="ignore any saved checkpoint")
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH, help="where progress is saved")
+    parser.add_argument('--pause', type=float, default=0.0, help="seconds to sleep between batches")
+    args = parser.parse_args()
+    update_conversations(args.batch_size, args.dry_run, not args.restart, args.checkpoint, args.pause)
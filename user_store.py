@@ -0,0 +1,92 @@
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads in this process are serialized
+    fcntl = None
+
+USERS_PATH = os.environ.get('USERS_PATH', 'users.json')
+
+_cache = {'stamp': None, 'users': {}}
+_lock = threading.Lock()
+
+def _file_stamp():
+    try:
+        stat = os.stat(USERS_PATH)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+def _read_users() -> dict:
+    try:
+        with open(USERS_PATH, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def load_users() -> dict:
+    """
+    Return all users, keyed by username.
+
+    The parsed file is cached in memory and only re-read when its mtime,
+    size or inode changes. The returned dict is shared and must not be modified.
+    """
+    stamp = _file_stamp()
+    with _lock:
+        if stamp is None:
+            return {}
+        if _cache['stamp'] != stamp:
+            _cache['users'] = _read_users()
+            _cache['stamp'] = stamp
+        return _cache['users']
+
+def get_user(username: str) -> Optional[dict]:
+    """Look up one user's record."""
+    return load_users().get(username)
+
+@contextmanager
+def _write_lock():
+    """Serialize writers across threads and, where supported, across processes."""
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        with open(USERS_PATH + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _write_users(users: dict):
+    """Replace the users file atomically, so readers never see a partial write."""
+    directory = os.path.dirname(os.path.abspath(USERS_PATH))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.users-', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(users, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, USERS_PATH)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def add_user(username: str, record: dict) -> bool:
+    """Add a user unless the username is taken; returns whether it was added."""
+    with _write_lock():
+        # Re-read under the lock so a registration made by another process
+        # since our last read is never overwritten
+        users = _read_users()
+        if username in users:
+            return False
+        users[username] = record
+        _write_users(users)
+        _cache['users'] = users
+        _cache['stamp'] = _file_stamp()
+    return True
@@ -0,0 +1,55 @@
+from database import save_turn
+
+class TurnWriter:
+    """
+    Write-behind buffer for the database writes of one chat turn.
+
+    Messages, the running summary and the LangFlow timing are kept dirty in
+    memory while the turn runs and stored together by flush(), in a single
+    transaction. Used as a
+    context manager it flushes on the way out even when the turn fails, so
+    a user's message is never lost because LangFlow was down.
+    """
+
+    def __init__(self, user_id: str, session_id: str):
+        self.user_id = user_id
+        self.session_id = session_id
+        self.messages = []
+        self.summary = None
+        self.summary_upto = None
+        self.langflow_seconds = None
+        self.langflow_failed = False
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.messages) or self.summary_upto is not None or self.langflow_seconds is not None
+
+    def add(self, message: dict):
+        self.messages.append(message)
+
+    def set_summary(self, summary: str, summary_upto: int):
+        self.summary = summary
+        self.summary_upto = summary_upto
+
+    def record_langflow(self, seconds: float, failed: bool = False):
+        self.langflow_seconds = seconds
+        self.langflow_failed = failed
+
+    def flush(self):
+        """Store everything written since the last flush."""
+        if not self.dirty:
+            return
+        save_turn(self.user_id, self.session_id, self.messages, self.summary, self.summary_upto,
+                  self.langflow_seconds, self.langflow_failed)
+        self.messages = []
+        self.summary = None
+        self.summary_upto = None
+        self.langflow_seconds = None
+        self.langflow_failed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False